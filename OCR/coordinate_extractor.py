@@ -1,10 +1,26 @@
 from pathlib import Path
 import cv2
-from paddleocr import PaddleOCR
+import numpy as np
+from paddleocr import PaddleOCR, TextRecognition
 from pdf2image import convert_from_path, pdfinfo_from_path
 from pdf2image.exceptions import PDFInfoNotInstalledError
 from docx2pdf import convert
+from ocr_cache import OCRCache
+from ocr_store import json_to_store, refresh_stores_below
+from page_hash_index import PageHashIndex
+try:
+    import fitz  # PyMuPDF, optional: used to extract embedded page images
+except ImportError:
+    fitz = None
 import json
+import os
+import queue
+import argparse
+import threading
+import multiprocessing
+import concurrent.futures
+import zipfile
+from xml.etree import ElementTree
 
 
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -23,48 +39,882 @@ _ocr_param_keys = [
     "use_doc_orientation_classify",      #textline orientation is enough for calculation of line angles, set to false 
     "use_doc_unwarping",                  #add padding to the image if you want to enable this feature,it causes the image to twist along a tensor and lead to less accurate predictions , set to false
     "use_textline_orientation",
+    "text_recognition_model_name",       #optional, also used for the recognition-only passes below
+    "ocr_version",                        #optional, PP-OCR model generation picked together with lang
 ]
 ocr_kwargs = {k: CONFIG[k] for k in _ocr_param_keys if k in CONFIG}
-ocr = PaddleOCR(**ocr_kwargs)
 
-def run_ocr_and_save_results(image_to_process, output_dir, basename=None):
-    """Runs OCR on a given image, handles errors, and saves the results."""
+# The OCR model is loaded lazily so that worker processes (see --workers) can
+# load their own copy with their own thread settings instead of inheriting one
+_ocr_engine = None
+
+def create_ocr_engine(**overrides):
+    """Creates a new PaddleOCR instance from config.json, with optional extra arguments."""
+    return PaddleOCR(**{**ocr_kwargs, **overrides})
+
+def get_ocr_engine():
+    """Returns the PaddleOCR instance of this process, loading the model on first use."""
+    global _ocr_engine
+    if _ocr_engine is None:
+        _ocr_engine = create_ocr_engine()
+    return _ocr_engine
+
+# Recognition model of PaddleOCR 3.x when neither lang nor ocr_version is set
+DEFAULT_TEXT_RECOGNITION_MODEL = "PP-OCRv5_server_rec"
+_text_recognizer = None
+_text_recognizer_lock = threading.Lock()
+
+def text_recognition_model_name():
+    """Returns the recognition model the full pipeline uses under config.json, or None if unknown.
+
+    An explicit "text_recognition_model_name" wins. Otherwise the model is
+    resolved from "lang" (and "ocr_version") the same way PaddleOCR(lang=...)
+    does it, so the recognition-only passes read with the same model as the
+    first pass.
+    """
+    model_name = CONFIG.get("text_recognition_model_name")
+    if model_name:
+        return model_name
+    lang, ocr_version = CONFIG.get("lang"), CONFIG.get("ocr_version")
+    if lang is None and ocr_version is None:
+        return DEFAULT_TEXT_RECOGNITION_MODEL
+    try:
+        # Private helper of PaddleOCR 3.x that maps lang/ocr_version to model names
+        _, model_name = PaddleOCR._get_ocr_model_names(object.__new__(PaddleOCR), lang, ocr_version)
+    except Exception:
+        model_name = None
+    if model_name is None and lang == "ch" and ocr_version is None:
+        model_name = DEFAULT_TEXT_RECOGNITION_MODEL
+    return model_name
+
+def get_text_recognizer():
+    """Returns the recognition-only model of this process, loading it on first use.
+
+    Raises RuntimeError if the model for the configured "lang" cannot be
+    determined; reading with a different model than the full pipeline would
+    silently give results in the wrong language.
+    """
+    global _text_recognizer
+    if _text_recognizer is None:
+        model_name = text_recognition_model_name()
+        if model_name is None:
+            raise RuntimeError(
+                f"Cannot determine the recognition model for lang '{CONFIG.get('lang')}'; "
+                "set \"text_recognition_model_name\" in config.json"
+            )
+        _text_recognizer = TextRecognition(model_name=model_name)
+    return _text_recognizer
+
+# Number of pages sent to PaddleOCR in a single predict call (1 = page by page)
+OCR_BATCH_SIZE = max(1, int(CONFIG.get("ocr_batch_size", 4)))
+
+# Producer/consumer mode for PDFs: rasterizer threads feed a bounded queue of
+# pages that OCR worker threads consume
+PIPELINE_ENABLED = bool(CONFIG.get("pipeline_enabled", False))
+PIPELINE_RASTERIZER_WORKERS = max(1, int(CONFIG.get("pipeline_rasterizer_workers", 2)))
+PIPELINE_OCR_WORKERS = max(1, int(CONFIG.get("pipeline_ocr_workers", 1)))
+PIPELINE_QUEUE_DEPTH = max(1, int(CONFIG.get("pipeline_queue_depth", 4)))
+
+# Rendering the overlay images is a large share of the per-page time, turn it
+# off in production where nobody looks at them
+SAVE_VISUALIZATIONS = bool(CONFIG.get("save_visualizations", True))
+
+# Page images of PDFs are only needed to resume a run and by the render stage,
+# OCR itself works on the in-memory page. They are written by a background
+# thread with a bounded number of pages waiting.
+SAVE_PAGE_IMAGES = bool(CONFIG.get("save_page_images", True))
+PAGE_IMAGE_WRITE_SLOTS = 4
+_page_image_writer = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+_page_image_write_slots = threading.BoundedSemaphore(PAGE_IMAGE_WRITE_SLOTS)
+_page_image_futures = []
+_page_image_futures_lock = threading.Lock()
+
+# Scanned manga PDFs usually hold one JPEG per page. With PyMuPDF installed
+# those images are extracted as they are instead of re-rendered at 300 DPI.
+EXTRACT_EMBEDDED_IMAGES = bool(CONFIG.get("pdf_extract_embedded_images", True)) and fitz is not None
+# Fraction of the page an embedded image must cover to stand in for the page
+EMBEDDED_IMAGE_MIN_COVERAGE = 0.98
+_pdf_documents = {}
+_pdf_documents_lock = threading.Lock()
+
+# Cheap pre-screen that skips OCR on blank pages and pages without anything
+# that looks like text (cover art, full-bleed illustrations)
+PREFILTER_ENABLED = bool(CONFIG.get("prefilter_enabled", False))
+PREFILTER_MAX_SIDE = int(CONFIG.get("prefilter_max_side", 512))
+PREFILTER_MIN_EDGE_DENSITY = float(CONFIG.get("prefilter_min_edge_density", 0.004))
+# Glyphs are counted at a larger size than the edges: at 512 pixels the letters
+# of a single bubble merge or vanish
+PREFILTER_GLYPH_SIDE = int(CONFIG.get("prefilter_glyph_side", 1536))
+PREFILTER_MIN_TEXT_COMPONENTS = int(CONFIG.get("prefilter_min_text_components", 2))
+PREFILTER_STATS = {"checked": 0, "skipped": 0}
+_prefilter_stats_lock = threading.Lock()
+
+# Tiling of very tall images (webtoon strips): instead of one predict call
+# that downscales the whole strip, overlapping full-width tiles are OCR'd and
+# their boxes merged back into page coordinates
+TILE_ENABLED = bool(CONFIG.get("tile_enabled", True))
+TILE_HEIGHT = max(64, int(CONFIG.get("tile_height", 2048)))
+TILE_OVERLAP = min(max(0, int(CONFIG.get("tile_overlap", 256))), TILE_HEIGHT // 2)
+TILE_MIN_ASPECT_RATIO = float(CONFIG.get("tile_min_aspect_ratio", 3.0))
+# Share of the smaller box two lines must overlap by to count as the same line
+TILE_DUPLICATE_OVERLAP = 0.5
+
+# Second pass that re-recognizes only the low-confidence lines of a page from
+# upscaled crops, so the first pass can run at a lower resolution
+REFINE_ENABLED = bool(CONFIG.get("refine_enabled", False))
+REFINE_SCORE_THRESHOLD = float(CONFIG.get("refine_score_threshold", 0.8))
+REFINE_UPSCALE = max(1.0, float(CONFIG.get("refine_upscale", 2.0)))
+REFINE_PADDING = max(0, int(CONFIG.get("refine_padding", 4)))
+RECOGNITION_BATCH_SIZE = 16
+# Lines recognized with a lower score are dropped in recognition-only mode,
+# same meaning as PaddleOCR's text_rec_score_thresh
+TEXT_REC_SCORE_THRESH = float(CONFIG.get("text_rec_score_thresh", 0.0))
+
+# Also pack the page results of every PDF into one compact store file
+# (see ocr_store.py) with per-page, per-field access
+OCR_STORE_ENABLED = bool(CONFIG.get("ocr_store_enabled", False))
+
+# Optional speech-bubble region proposals: only the bright, enclosed bubbles
+# of a page are sent to the OCR model, which cuts the pixels per page. Pages
+# without reliable proposals fall back to full-page OCR.
+BUBBLE_PROPOSALS_ENABLED = bool(CONFIG.get("bubble_proposals_enabled", False))
+BUBBLE_BRIGHTNESS = int(CONFIG.get("bubble_brightness", 200))
+BUBBLE_MIN_AREA = float(CONFIG.get("bubble_min_area", 0.001))
+BUBBLE_MAX_AREA = float(CONFIG.get("bubble_max_area", 0.25))
+BUBBLE_MAX_COVERAGE = float(CONFIG.get("bubble_max_coverage", 0.6))
+BUBBLE_PADDING = 8
+BUBBLE_WORK_SIDE = 1024
+
+# DOCX files with up to this many characters of text are treated as pasted
+# page images and read directly from the archive; longer documents are
+# converted to PDF through an office suite
+DOCX_MAX_TEXT_CHARS = int(CONFIG.get("docx_max_text_chars", 200))
+WORD_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+DRAWING_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+VML_NS = "urn:schemas-microsoft-com:vml"
+RELATIONSHIP_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+def ocr_cache_params():
+    """Returns every setting that changes the OCR output, used as part of the cache key."""
+    params = dict(ocr_kwargs)
+    if TILE_ENABLED:
+        params["tiling"] = [TILE_HEIGHT, TILE_OVERLAP, TILE_MIN_ASPECT_RATIO]
+    if REFINE_ENABLED:
+        params["refine"] = [REFINE_SCORE_THRESHOLD, REFINE_UPSCALE, REFINE_PADDING]
+    if BUBBLE_PROPOSALS_ENABLED:
+        params["bubbles"] = [BUBBLE_BRIGHTNESS, BUBBLE_MIN_AREA, BUBBLE_MAX_AREA, BUBBLE_MAX_COVERAGE]
+    return params
+
+# Content-addressed cache of OCR results, shared by images and PDF pages
+OCR_CACHE = None
+if CONFIG.get("ocr_cache_enabled", True):
+    OCR_CACHE = OCRCache(
+        SCRIPT_DIR.parent / CONFIG.get("ocr_cache_dir", "cache/ocr"),
+        max_bytes=int(float(CONFIG.get("ocr_cache_max_mb", 512)) * 1024 * 1024),
+        params=ocr_cache_params(),
+    )
+
+# Perceptual hash index over all processed pages: repeated credits pages,
+# title cards and recaps reuse the OCR (and translation) of an earlier copy
+PAGE_HASH_INDEX = None
+# A hash match is only reused when the pages also agree pixel for pixel inside
+# the source's text boxes: at most this fraction of a box (and never more than
+# PAGE_MATCH_MIN_DIFF_PIXELS pixels) may differ by more than PAGE_MATCH_PIXEL_DIFF
+PAGE_MATCH_PIXEL_DIFF = 64
+PAGE_MATCH_MAX_DIFF_FRACTION = 0.005
+PAGE_MATCH_MIN_DIFF_PIXELS = 20
+if CONFIG.get("page_dedup_enabled", False):
+    PAGE_HASH_INDEX = PageHashIndex(
+        SCRIPT_DIR.parent / CONFIG.get("page_dedup_index", "cache/page_hashes.jsonl"),
+        results_root=OUTPUT_DIR,
+        max_distance=int(CONFIG.get("page_dedup_max_distance", 10)),
+        params=ocr_cache_params(),
+    )
+
+def json_output_path_for(output_dir, basename=None):
+    """Returns the path of the JSON result file for a page."""
+    # Name the JSON results based on the input file/page
+    json_filename = f"{basename}.json" if basename else "ocr_result.json"
+    return output_dir / json_filename
+
+def write_result_json(data, json_output_path):
+    """Writes an OCR result dict in the same layout as PaddleOCR's save_to_json."""
+    with open(json_output_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+def empty_ocr_result(skip_reason=None):
+    """Returns an OCR result without any text, optionally marked as skipped."""
+    data = {
+        "input_path": None,
+        "page_index": None,
+        "dt_polys": [],
+        "rec_texts": [],
+        "rec_scores": [],
+        "rec_polys": [],
+        "rec_boxes": [],
+    }
+    if skip_reason is not None:
+        data["skipped"] = True
+        data["skip_reason"] = skip_reason
+    return data
+
+def select_pages(indices, *columns):
+    """Keeps only the entries at `indices` of several parallel lists."""
+    return tuple([column[i] for i in indices] for column in columns)
+
+def page_has_plausible_text(image):
+    """Cheap check whether a page can contain text at all, before running the OCR model.
+
+    A page whose edge density (at PREFILTER_MAX_SIDE) is almost zero is
+    blank. Otherwise text has to show up as a minimum number of small,
+    glyph-sized dark connected components, counted at PREFILTER_GLYPH_SIDE
+    so that the few letters of a single speech bubble stay separate.
+    Returns (has_text, reason).
+    """
+    full_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    def downsample(max_side):
+        scale = max_side / max(full_gray.shape[:2])
+        if scale >= 1:
+            return full_gray
+        return cv2.resize(full_gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    edges = cv2.Canny(downsample(PREFILTER_MAX_SIDE), 100, 200)
+    edge_density = np.count_nonzero(edges) / edges.size
+    if edge_density < PREFILTER_MIN_EDGE_DENSITY:
+        return False, f"edge density {edge_density:.4f}"
+
+    gray = downsample(PREFILTER_GLYPH_SIDE)
+
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    fill = stats[1:, cv2.CC_STAT_AREA] / np.maximum(widths * heights, 1)
+    max_glyph = max(gray.shape) * 0.08
+    glyph_like = (
+        (heights >= 3) & (heights <= max_glyph)
+        & (widths >= 2) & (widths <= max_glyph)
+        & (widths <= heights * 5) & (heights <= widths * 12)
+        & (fill >= 0.1) & (fill <= 0.95)
+    )
+    glyph_count = int(np.count_nonzero(glyph_like))
+    if glyph_count < PREFILTER_MIN_TEXT_COMPONENTS:
+        return False, f"{glyph_count} glyph-like components"
+    return True, None
+
+def record_prefilter_result(skipped):
+    """Counts a page checked by the pre-filter."""
+    with _prefilter_stats_lock:
+        PREFILTER_STATS["checked"] += 1
+        if skipped:
+            PREFILTER_STATS["skipped"] += 1
+
+def report_prefilter_stats(stats=None):
+    """Prints how many pages the pre-filter skipped."""
+    stats = stats or PREFILTER_STATS
+    if PREFILTER_ENABLED:
+        print(f"Pre-filter skipped OCR on {stats['skipped']} of {stats['checked']} pages without plausible text.")
+
+def save_ocr_visualizations(result, output_dir, basename=None):
+    """Writes the visualization images of an OCR result to fixed file names.
+
+    PaddleOCR renders one image per entry of `result.img` (the OCR overlay and,
+    with document preprocessing enabled, the preprocessed page). They are saved
+    as `<basename>_visualization_<i>.png` directly, without scanning the
+    output directory.
+    """
+    prefix = basename or "ocr_result"
+    for i, image in enumerate(result.img.values()):
+        image_path = output_dir / f"{prefix}_visualization_{i + 1}.png"
+        if isinstance(image, np.ndarray):
+            cv2.imwrite(str(image_path), image)
+        else:
+            image.save(image_path)
+        print(f"    - Saved visualization to {image_path}")
+
+def save_ocr_result(result, output_dir, basename=None):
+    """Saves the JSON results and visualizations of a single OCR result."""
+    json_output_path = json_output_path_for(output_dir, basename)
+    result.save_to_json(str(json_output_path))
+    print(f"    - Saved JSON results to {json_output_path}")
+
+    if SAVE_VISUALIZATIONS:
+        save_ocr_visualizations(result, output_dir, basename)
+
+def run_ocr_batch_and_save_results(images, output_dirs, basenames, engine=None):
+    """Runs OCR on several images in one predict call and saves each result separately.
+
+    `images`, `output_dirs` and `basenames` are parallel lists, the i-th result
+    returned by PaddleOCR belongs to the i-th image. `engine` defaults to the
+    PaddleOCR instance of the current process.
+
+    Pages whose pixels and OCR settings are already in OCR_CACHE are not sent
+    to the model, their cached result is copied instead. Pages that look like
+    a page already processed (PAGE_HASH_INDEX) reuse its result. With the pre-filter
+    enabled, pages without plausible text get an empty, skipped result.
+    """
     try:
-        print("    - Running OCR...")
-        result = ocr.predict(image_to_process)
-
-        if result and result[0]:
-            # Save JSON results with a name based on the input file/page
-            json_filename = f"{basename}.json" if basename else "ocr_result.json"
-            json_output_path = output_dir / json_filename
-            result[0].save_to_json(str(json_output_path))
-            print(f"    - Saved JSON results to {json_output_path}")
-
-            # 1. Get list of files before saving images
-            files_before = set(p.name for p in output_dir.glob('*'))
-
-            # 2. Let PaddleOCR save the images with its default random names
-            result[0].save_to_img(str(output_dir))
-            print(f"    - Saved visualization(s) to {output_dir}")
-
-            # 3. Find the newly created image files
-            files_after = set(p.name for p in output_dir.glob('*'))
-            new_files = files_after - files_before
-
-            # 4. Rename the new files if a basename is provided
-            if basename:
-                new_images = sorted([f for f in new_files if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-                for i, filename in enumerate(new_images):
-                    old_path = output_dir / filename
-                    new_name = f"{basename}_visualization_{i + 1}{old_path.suffix}"
-                    new_path = output_dir / new_name
-                    old_path.rename(new_path)
-                    print(f"    - Renamed {filename} to {new_name}")
+        keys = [None] * len(images)
+        if OCR_CACHE is not None:
+            missing = []
+            for i, image in enumerate(images):
+                keys[i] = OCR_CACHE.key_for(image)
+                json_output_path = json_output_path_for(output_dirs[i], basenames[i])
+                if OCR_CACHE.get(keys[i], json_output_path):
+                    print(f"    - Reused cached OCR results for {json_output_path}")
+                    with open(json_output_path, "r", encoding="utf-8") as f:
+                        save_detections(json.load(f), image.shape, output_dirs[i], basenames[i])
+                else:
+                    missing.append(i)
+            images, output_dirs, basenames, keys = select_pages(missing, images, output_dirs, basenames, keys)
+
+        page_hashes = [None] * len(images)
+        if PAGE_HASH_INDEX is not None:
+            unseen = []
+            for i, image in enumerate(images):
+                page_hashes[i] = PAGE_HASH_INDEX.hash_image(image)
+                match = PAGE_HASH_INDEX.find(
+                    page_hashes[i], image.shape,
+                    confirm=lambda json_path, source_shape, image=image: pages_match(image, json_path, source_shape),
+                )
+                if match is not None:
+                    reuse_page_result(match[0], match[1], image.shape, output_dirs[i], basenames[i])
+                else:
+                    unseen.append(i)
+            images, output_dirs, basenames, keys, page_hashes = select_pages(unseen, images, output_dirs, basenames, keys, page_hashes)
+
+        if PREFILTER_ENABLED:
+            plausible = []
+            for i, image in enumerate(images):
+                has_text, reason = page_has_plausible_text(image)
+                record_prefilter_result(skipped=not has_text)
+                if has_text:
+                    plausible.append(i)
+                else:
+                    json_output_path = json_output_path_for(output_dirs[i], basenames[i])
+                    write_result_json(empty_ocr_result(skip_reason=reason), json_output_path)
+                    print(f"    - Skipped OCR, no plausible text ({reason}): {json_output_path}")
+            images, output_dirs, basenames, keys, page_hashes = select_pages(plausible, images, output_dirs, basenames, keys, page_hashes)
+
+        if not images:
+            return
+
+        engine = engine or get_ocr_engine()
+
+        # Very tall pages (webtoon strips) are OCR'd in overlapping tiles
+        regular = []
+        for i, image in enumerate(images):
+            if needs_tiling(image):
+                run_tiled_ocr_and_save_results(image, output_dirs[i], basenames[i], engine)
+                finish_page_result(image, output_dirs[i], basenames[i], keys[i], page_hashes[i])
+            else:
+                regular.append(i)
+        images, output_dirs, basenames, keys, page_hashes = select_pages(regular, images, output_dirs, basenames, keys, page_hashes)
+
+        # Pages with reliable speech-bubble proposals are OCR'd on the bubbles only
+        if BUBBLE_PROPOSALS_ENABLED:
+            full_page = []
+            for i, image in enumerate(images):
+                if run_bubble_ocr_and_save_results(image, output_dirs[i], basenames[i], engine):
+                    finish_page_result(image, output_dirs[i], basenames[i], keys[i], page_hashes[i])
+                else:
+                    full_page.append(i)
+            images, output_dirs, basenames, keys, page_hashes = select_pages(full_page, images, output_dirs, basenames, keys, page_hashes)
+
+        if not images:
+            return
+
+        if len(images) > 1:
+            print(f"    - Running OCR on a batch of {len(images)} pages...")
         else:
-            print("    - No text found in image.")
+            print("    - Running OCR...")
+        results = engine.predict(images)
+
+        for i, (output_dir, basename) in enumerate(zip(output_dirs, basenames)):
+            result = results[i] if results and i < len(results) else None
+            if result:
+                save_ocr_result(result, output_dir, basename)
+                finish_page_result(images[i], output_dir, basename, keys[i], page_hashes[i])
+            else:
+                print(f"    - No text found in {basename or 'image'}.")
     except Exception as e:
         print(f"    - An error occurred during OCR processing: {e}")
 
+def crop_text_line(image, poly, padding=0):
+    """Cuts a text line out of a page as an upright image, the way PaddleOCR does before recognition.
+
+    The quadrilateral is grown by `padding` pixels and warped to a rectangle.
+    Vertical lines (much taller than wide) are rotated by 90 degrees.
+    """
+    points = np.asarray(poly, dtype=np.float32)
+    if len(points) != 4:
+        points = cv2.boxPoints(cv2.minAreaRect(points))
+    if padding:
+        center = points.mean(axis=0)
+        points = points + np.sign(points - center) * padding
+
+    width = int(round(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3]))))
+    height = int(round(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2]))))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    if height >= 1.5 * width:
+        crop = np.ascontiguousarray(np.rot90(crop))
+    return crop
+
+def recognize_crops(crops):
+    """Runs the recognition-only model on text line crops, returns (text, score) pairs."""
+    if not crops:
+        return []
+    with _text_recognizer_lock:
+        results = get_text_recognizer().predict(input=crops, batch_size=RECOGNITION_BATCH_SIZE)
+        return [(result["rec_text"], float(result["rec_score"])) for result in results]
+
+def polygon_key(poly):
+    """Returns a hashable key of a polygon given as nested lists or an array."""
+    return tuple(tuple(int(v) for v in point) for point in poly)
+
+def refine_low_confidence_lines(image, data):
+    """Re-recognizes the low-confidence lines of a page result from upscaled crops.
+
+    Only lines whose score is below REFINE_SCORE_THRESHOLD are cropped from
+    the page, upscaled by REFINE_UPSCALE and sent through recognition again;
+    detection is not repeated. A new reading replaces the old one in `data`
+    only when its score is higher. Returns the number of improved lines.
+    """
+    scores = data.get("rec_scores") or []
+    low_confidence = [i for i, score in enumerate(scores) if score < REFINE_SCORE_THRESHOLD]
+    if not low_confidence:
+        return 0
+
+    try:
+        with _text_recognizer_lock:
+            get_text_recognizer()
+    except RuntimeError as e:
+        print(f"    - Skipping the low-confidence pass: {e}")
+        return 0
+
+    # The orientation angles belong to the detected polygons, rec_polys are
+    # the ones among them whose text passed the score threshold
+    angles = data.get("textline_orientation_angles") or []
+    angle_of = {polygon_key(poly): angle for poly, angle in zip(data.get("dt_polys") or [], angles)}
+
+    crops = []
+    for i in low_confidence:
+        crop = crop_text_line(image, data["rec_polys"][i], padding=REFINE_PADDING)
+        # Lines the orientation classifier found upside down, as in recognize_page_from_detections
+        if angle_of.get(polygon_key(data["rec_polys"][i])) == 1:
+            crop = cv2.rotate(crop, cv2.ROTATE_180)
+        crops.append(cv2.resize(crop, None, fx=REFINE_UPSCALE, fy=REFINE_UPSCALE, interpolation=cv2.INTER_CUBIC))
+
+    improved = 0
+    for i, (text, score) in zip(low_confidence, recognize_crops(crops)):
+        if score > scores[i]:
+            data["rec_texts"][i] = text
+            data["rec_scores"][i] = score
+            improved += 1
+
+    print(f"    - Re-recognized {len(low_confidence)} low-confidence line(s) at {REFINE_UPSCALE:g}x, improved {improved}")
+    return improved
+
+def detections_path_for(output_dir, basename=None):
+    """Returns the path of the file holding the detected text polygons of a page."""
+    return output_dir / f"{basename or 'ocr_result'}_det.json"
+
+def save_detections(data, image_shape, output_dir, basename=None):
+    """Persists the detection stage output of a page next to its OCR results.
+
+    The polygons (with the text line orientations) are all the recognition-
+    only mode needs to re-read a page, see recognize_from_detections.
+    """
+    detections = {
+        "image_shape": list(image_shape[:2]),
+        "dt_polys": data.get("dt_polys", []),
+        "textline_orientation_angles": data.get("textline_orientation_angles", []),
+    }
+    with open(detections_path_for(output_dir, basename), "w", encoding="utf-8") as f:
+        json.dump(detections, f)
+
+def finish_page_result(image, output_dir, basename, cache_key, page_hash=None):
+    """Post-processes a freshly OCR'd page and stores the final result in the cache.
+
+    Saves the detected polygons separately, runs the optional second
+    recognition pass on low-confidence lines and adds the page to the
+    perceptual hash index.
+    """
+    json_output_path = json_output_path_for(output_dir, basename)
+    with open(json_output_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    save_detections(data, image.shape, output_dir, basename)
+    if REFINE_ENABLED:
+        try:
+            if refine_low_confidence_lines(image, data):
+                write_result_json(data, json_output_path)
+        except Exception as e:
+            print(f"    - Could not refine low-confidence lines of {json_output_path}: {e}")
+    if OCR_CACHE is not None:
+        OCR_CACHE.put(cache_key, json_output_path)
+    if PAGE_HASH_INDEX is not None and page_hash is not None:
+        PAGE_HASH_INDEX.add(page_hash, image.shape, json_output_path)
+
+def strong_differences(a, b):
+    """Returns a boolean mask of the pixels where two same-sized grayscale images clearly differ."""
+    a = cv2.GaussianBlur(a, (3, 3), 0).astype(np.int16)
+    b = cv2.GaussianBlur(b, (3, 3), 0).astype(np.int16)
+    return np.abs(a - b) > PAGE_MATCH_PIXEL_DIFF
+
+def pages_match(image, source_json_path, source_shape):
+    """Confirms a perceptual-hash match against the source page's pixels.
+
+    The page is scaled to the source page's size and compared inside every
+    text box of the source result at full resolution, where a different line
+    of dialogue or chapter number shows up even though the artwork (and so
+    the hash) is identical. The whole page is also compared at a reduced
+    size, for text where the source had none. Pages whose source image is no
+    longer available are not reused.
+    """
+    source_path = find_page_image(source_json_path.parent, source_json_path.stem)
+    source = cv2.imread(str(source_path), cv2.IMREAD_GRAYSCALE) if source_path else None
+    if source is None or list(source.shape[:2]) != list(source_shape[:2]):
+        return False
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    gray = cv2.resize(gray, (source.shape[1], source.shape[0]), interpolation=cv2.INTER_AREA)
+
+    scale = 512 / max(source.shape)
+    small_size = (max(1, round(source.shape[1] * scale)), max(1, round(source.shape[0] * scale)))
+    small_differences = strong_differences(cv2.resize(gray, small_size, interpolation=cv2.INTER_AREA),
+                                           cv2.resize(source, small_size, interpolation=cv2.INTER_AREA))
+    if small_differences.mean() > PAGE_MATCH_MAX_DIFF_FRACTION:
+        return False
+
+    with open(source_json_path, "r", encoding="utf-8") as f:
+        boxes = json.load(f).get("rec_boxes") or []
+    for x0, y0, x1, y1 in boxes:
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        differences = strong_differences(gray[y0:int(y1), x0:int(x1)], source[y0:int(y1), x0:int(x1)])
+        if differences.size and differences.sum() > max(PAGE_MATCH_MIN_DIFF_PIXELS, PAGE_MATCH_MAX_DIFF_FRACTION * differences.size):
+            return False
+    return True
+
+def reuse_page_result(source_json_path, source_shape, shape, output_dir, basename):
+    """Copies the result of a known, near-identical page to this page.
+
+    Coordinates are scaled to this page's size. The copy records where it
+    came from in "reused_from", so the translation stage can reuse the
+    source page's translation as well; a source that is already translated
+    is copied with its translation.
+    """
+    with open(source_json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    scale = np.array([shape[1] / source_shape[1], shape[0] / source_shape[0]])
+    if not np.allclose(scale, 1):
+        for key in ("dt_polys", "rec_polys"):
+            data[key] = [np.rint(np.asarray(poly) * scale).astype(int).tolist() for poly in data.get(key, [])]
+        data["rec_boxes"] = [np.rint(np.asarray(box) * np.tile(scale, 2)).astype(int).tolist() for box in data.get("rec_boxes", [])]
+    data["reused_from"] = Path(os.path.relpath(source_json_path, OUTPUT_DIR)).as_posix()
+
+    json_output_path = json_output_path_for(output_dir, basename)
+    write_result_json(data, json_output_path)
+    save_detections(data, shape, output_dir, basename)
+    print(f"    - Page matches {data['reused_from']}, reused its results: {json_output_path}")
+
+def find_page_image(output_dir, basename):
+    """Finds the image a page result was produced from: the saved PDF page or the input image."""
+    candidates = [output_dir / f"{basename}.png"]
+    candidates += [INPUT_DIR / f"{basename}{ext}" for ext in (".png", ".jpg", ".jpeg")]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return None
+
+def recognize_page_from_detections(detections_path):
+    """Re-runs only the recognition stage of one page, on its stored detection polygons."""
+    output_dir = detections_path.parent
+    basename = detections_path.name[:-len("_det.json")]
+    image_path = find_page_image(output_dir, basename)
+    if image_path is None:
+        print(f"  - No page image found for {detections_path}, skipping.")
+        return
+    image = cv2.imread(str(image_path))
+    if image is None:
+        print(f"  - Error: Could not read image {image_path}")
+        return
+
+    with open(detections_path, "r", encoding="utf-8") as f:
+        detections = json.load(f)
+    if list(image.shape[:2]) != detections["image_shape"]:
+        print(f"  - {image_path} does not match the stored detections, skipping.")
+        return
+
+    polys = detections["dt_polys"]
+    angles = detections.get("textline_orientation_angles") or []
+    crops = []
+    for i, poly in enumerate(polys):
+        crop = crop_text_line(image, poly)
+        # Lines the orientation classifier found upside down
+        if i < len(angles) and angles[i] == 1:
+            crop = cv2.rotate(crop, cv2.ROTATE_180)
+        crops.append(crop)
+
+    lines = []
+    for poly, (text, score) in zip(polys, recognize_crops(crops)):
+        if score >= TEXT_REC_SCORE_THRESH:
+            lines.append({"text": text, "score": score, "poly": np.asarray(poly, dtype=np.int64)})
+
+    # Keep the other fields of an existing result, only the recognition output changes
+    json_output_path = json_output_path_for(output_dir, basename)
+    data = empty_ocr_result()
+    if json_output_path.exists():
+        with open(json_output_path, "r", encoding="utf-8") as f:
+            data.update(json.load(f))
+    # The page gets new source text, drop the state of the translation stage
+    data.pop("translated", None)
+    data.pop("reused_from", None)
+    recognized = lines_to_result(lines)
+    for key in ("rec_texts", "rec_scores", "rec_polys", "rec_boxes"):
+        data[key] = recognized[key]
+    data["dt_polys"] = polys
+    write_result_json(data, json_output_path)
+    print(f"  - Recognized {len(lines)} of {len(polys)} stored text boxes: {json_output_path}")
+
+def recognize_from_detections(root_dir):
+    """Recognition-only mode: re-reads every page under `root_dir` from its stored detections.
+
+    Detection is the expensive half of the OCR pipeline and does not depend
+    on the recognition language or model, so after changing `lang` or
+    `text_recognition_model_name` only the stored boxes are cropped and
+    batched through the recognizer.
+    """
+    try:
+        with _text_recognizer_lock:
+            get_text_recognizer()
+    except RuntimeError as e:
+        print(f"Recognition-only mode: {e}")
+        return
+
+    detection_files = sorted(Path(root_dir).rglob("*_det.json"))
+    print(f"Recognition-only mode: {len(detection_files)} page(s) with stored detections in {root_dir}")
+    for detections_path in detection_files:
+        try:
+            recognize_page_from_detections(detections_path)
+        except Exception as e:
+            print(f"  - An error occurred while recognizing {detections_path}: {e}")
+
+    # The page JSON files were rewritten, compact stores of them are stale now
+    for store_path in refresh_stores_below(root_dir):
+        print(f"Updated compact OCR store {store_path}")
+
+def needs_tiling(image):
+    """Returns True for images tall enough to be OCR'd in tiles."""
+    height, width = image.shape[:2]
+    return TILE_ENABLED and height > TILE_HEIGHT and height >= TILE_MIN_ASPECT_RATIO * width
+
+def tile_regions(height, width):
+    """Splits a tall image into full-width (x0, y0, x1, y1) tiles overlapping by TILE_OVERLAP."""
+    step = TILE_HEIGHT - TILE_OVERLAP
+    starts = [0]
+    while starts[-1] + TILE_HEIGHT < height:
+        starts.append(starts[-1] + step)
+    return [(0, y0, width, min(y0 + TILE_HEIGHT, height)) for y0 in starts]
+
+def ocr_regions(image, regions, engine):
+    """Runs OCR on rectangular regions of an image and maps the results back to image space.
+
+    Regions are sent to the model OCR_BATCH_SIZE at a time. Only the text
+    lines are kept from every result, so memory use does not grow with the
+    number of regions. Returns a list of lines: dicts with "text", "score",
+    "poly" (int array in image coordinates) and "region" (index in `regions`).
+    """
+    lines = []
+    for start in range(0, len(regions), OCR_BATCH_SIZE):
+        batch = regions[start:start + OCR_BATCH_SIZE]
+        crops = [np.ascontiguousarray(image[y0:y1, x0:x1]) for x0, y0, x1, y1 in batch]
+        results = engine.predict(crops)
+        for offset, (region, result) in enumerate(zip(batch, results)):
+            x0, y0 = region[0], region[1]
+            for text, score, poly in zip(result["rec_texts"], result["rec_scores"], result["rec_polys"]):
+                lines.append({
+                    "text": text,
+                    "score": float(score),
+                    "poly": np.asarray(poly, dtype=np.int64) + (x0, y0),
+                    "region": start + offset,
+                })
+    return lines
+
+def line_boxes(lines):
+    """Returns the axis aligned (x0, y0, x1, y1) boxes of OCR lines as an (n, 4) array."""
+    if not lines:
+        return np.zeros((0, 4), dtype=np.int64)
+    return np.array([[*line["poly"].min(axis=0), *line["poly"].max(axis=0)] for line in lines])
+
+def lines_to_result(lines):
+    """Builds a PaddleOCR style result dict from merged OCR lines."""
+    data = empty_ocr_result()
+    boxes = line_boxes(lines)
+    for line, box in zip(lines, boxes):
+        poly = line["poly"].tolist()
+        data["dt_polys"].append(poly)
+        data["rec_polys"].append(poly)
+        data["rec_texts"].append(line["text"])
+        data["rec_scores"].append(line["score"])
+        data["rec_boxes"].append(box.tolist())
+    return data
+
+def dedupe_tile_lines(lines, tiles):
+    """Removes lines detected twice in the band where two neighbouring tiles overlap.
+
+    Two lines from adjacent tiles are the same line when their boxes overlap
+    by more than TILE_DUPLICATE_OVERLAP of the smaller box. The copy that is
+    cut by its tile's edge is dropped; if neither or both are cut, the one
+    with the lower recognition score is dropped.
+    """
+    boxes = line_boxes(lines)
+    regions = np.array([line["region"] for line in lines], dtype=np.int64)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 1) * np.maximum(boxes[:, 3] - boxes[:, 1], 1)
+    keep = np.ones(len(lines), dtype=bool)
+
+    for t in range(len(tiles) - 1):
+        band_top, band_bottom = tiles[t + 1][1], tiles[t][3]
+        upper = np.flatnonzero((regions == t) & (boxes[:, 3] > band_top))
+        lower = np.flatnonzero((regions == t + 1) & (boxes[:, 1] < band_bottom))
+        for i in upper:
+            for j in lower:
+                if not (keep[i] and keep[j]):
+                    continue
+                overlap_w = min(boxes[i, 2], boxes[j, 2]) - max(boxes[i, 0], boxes[j, 0])
+                overlap_h = min(boxes[i, 3], boxes[j, 3]) - max(boxes[i, 1], boxes[j, 1])
+                if overlap_w <= 0 or overlap_h <= 0:
+                    continue
+                if overlap_w * overlap_h <= TILE_DUPLICATE_OVERLAP * min(areas[i], areas[j]):
+                    continue
+
+                i_cut = boxes[i, 3] >= band_bottom - 2
+                j_cut = boxes[j, 1] <= band_top + 2
+                if i_cut != j_cut:
+                    keep[i if i_cut else j] = False
+                else:
+                    keep[i if lines[i]["score"] < lines[j]["score"] else j] = False
+
+    return [line for line, kept in zip(lines, keep) if kept]
+
+def run_tiled_ocr_and_save_results(image, output_dir, basename, engine):
+    """OCRs a very tall image in overlapping tiles and saves the merged result.
+
+    Tiles are views into the image, so no pixel data is copied. Boxes are
+    shifted back to global coordinates and lines found twice in an overlap
+    band are de-duplicated.
+    """
+    height, width = image.shape[:2]
+    tiles = tile_regions(height, width)
+    print(f"    - Running OCR on {len(tiles)} tiles of a {width}x{height} image...")
+
+    lines = dedupe_tile_lines(ocr_regions(image, tiles, engine), tiles)
+    json_output_path = json_output_path_for(output_dir, basename)
+    write_result_json(lines_to_result(lines), json_output_path)
+    print(f"    - Saved JSON results to {json_output_path}")
+
+def merge_overlapping_regions(regions):
+    """Merges (x0, y0, x1, y1) regions that overlap until none do, so no text is OCR'd twice."""
+    regions = [list(region) for region in regions]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(region) for region in regions]
+
+def propose_bubble_regions(image):
+    """Proposes speech-bubble regions of a page with classical image processing.
+
+    Bubbles are bright areas enclosed by an outline, with dark text inside.
+    The page is downsampled and thresholded; bright connected components that
+    do not touch the page border (gutters and margins do), have a plausible
+    size, are reasonably compact and contain some dark pixels are kept.
+    Returns padded (x0, y0, x1, y1) regions in page coordinates.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape[:2]
+    scale = min(1.0, BUBBLE_WORK_SIDE / max(height, width))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+
+    _, bright = cv2.threshold(small, BUBBLE_BRIGHTNESS, 255, cv2.THRESH_BINARY)
+    # Break thin bright bridges between a bubble and the background
+    bright = cv2.morphologyEx(bright, cv2.MORPH_OPEN, np.ones((3, 3), dtype=np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(bright, connectivity=4)
+    if count <= 1:
+        return []
+
+    small_h, small_w = small.shape[:2]
+    x, y = stats[1:, cv2.CC_STAT_LEFT], stats[1:, cv2.CC_STAT_TOP]
+    w, h = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    area = stats[1:, cv2.CC_STAT_AREA]
+    page_area = small_h * small_w
+
+    # Number of dark pixels inside every component's bounding box, from an integral image
+    dark = cv2.integral((bright == 0).astype(np.uint8))
+    dark_in_box = dark[y + h, x + w] - dark[y, x + w] - dark[y + h, x] + dark[y, x]
+
+    keep = (
+        (area >= BUBBLE_MIN_AREA * page_area) & (area <= BUBBLE_MAX_AREA * page_area)
+        & (x > 0) & (y > 0) & (x + w < small_w) & (y + h < small_h)
+        & (area >= 0.4 * w * h)
+        & (dark_in_box >= 0.01 * w * h)
+    )
+
+    pad = BUBBLE_PADDING
+    regions = []
+    for bx, by, bw, bh in zip(x[keep], y[keep], w[keep], h[keep]):
+        regions.append((
+            max(0, int(bx / scale) - pad),
+            max(0, int(by / scale) - pad),
+            min(width, int((bx + bw) / scale) + pad),
+            min(height, int((by + bh) / scale) + pad),
+        ))
+    return merge_overlapping_regions(regions)
+
+def run_bubble_ocr_and_save_results(image, output_dir, basename, engine):
+    """OCRs only the proposed speech-bubble regions of a page and saves the merged result.
+
+    Returns False without saving anything when the proposals look unreliable
+    (none found, or they cover so much of the page that there is nothing to
+    gain) or when no text was found in them; the page then goes through the
+    normal full-page OCR.
+    """
+    regions = propose_bubble_regions(image)
+    if not regions:
+        return False
+    height, width = image.shape[:2]
+    coverage = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions) / (height * width)
+    if coverage > BUBBLE_MAX_COVERAGE:
+        return False
+
+    print(f"    - Running OCR on {len(regions)} bubble region(s) covering {coverage:.0%} of the page...")
+    lines = ocr_regions(image, regions, engine)
+    if not lines:
+        print("    - No text found in the bubble regions, falling back to full-page OCR.")
+        return False
+
+    json_output_path = json_output_path_for(output_dir, basename)
+    write_result_json(lines_to_result(lines), json_output_path)
+    print(f"    - Saved JSON results to {json_output_path}")
+    return True
+
+def run_ocr_and_save_results(image_to_process, output_dir, basename=None):
+    """Runs OCR on a given image, handles errors, and saves the results."""
+    run_ocr_batch_and_save_results([image_to_process], [output_dir], [basename])
+
 def process_image(image_path):
     """Processes a single image file (PNG, JPG, JPEG)."""
     print(f"Processing {image_path.name}...")
@@ -92,8 +942,183 @@ def update_config_for_pdf(pdf_name, page_count):
     except Exception as e:
         print(f"Error updating config.json: {e}")
 
-def process_pdf(pdf_path):
-    """Converts a PDF to images, saves them, resizes if necessary, and runs OCR on each page."""
+def get_pdf_document(pdf_path):
+    """Returns an open PyMuPDF document for `pdf_path`, opened once per process (lock held)."""
+    key = str(pdf_path)
+    document = _pdf_documents.get(key)
+    if document is None:
+        document = fitz.open(key)
+        _pdf_documents[key] = document
+    return document
+
+def close_pdf_document(pdf_path):
+    """Closes the PyMuPDF document opened for `pdf_path`, if any."""
+    with _pdf_documents_lock:
+        document = _pdf_documents.pop(str(pdf_path), None)
+    if document is not None:
+        document.close()
+
+def extract_embedded_page_image(pdf_path, page_num):
+    """Returns the embedded image of a scanned page as a BGR array, or None.
+
+    Only pages made of exactly one upright, opaque image that covers the whole
+    page, without any text or vector drawings, qualify. Their image is decoded
+    from the original bytes at its native resolution. Everything else returns
+    None and goes through the normal rasterization.
+    """
+    # PyMuPDF objects must not be used from several threads at once
+    with _pdf_documents_lock:
+        document = get_pdf_document(pdf_path)
+        page = document[page_num - 1]
+        if page.rotation != 0:
+            return None
+
+        images = page.get_images(full=True)
+        if len(images) != 1:
+            return None
+        xref, smask = images[0][0], images[0][1]
+        if smask:
+            return None
+        if page.get_text("text").strip() or page.get_drawings():
+            return None
+
+        placements = page.get_image_rects(xref, transform=True)
+        if len(placements) != 1:
+            return None
+        image_rect, matrix = placements[0]
+        # Rotated or mirrored placements would need the page transform applied
+        if matrix.b != 0 or matrix.c != 0 or matrix.a <= 0 or matrix.d <= 0:
+            return None
+        page_rect = page.rect
+        if (image_rect & page_rect).get_area() < EMBEDDED_IMAGE_MIN_COVERAGE * page_rect.get_area():
+            return None
+
+        extracted = document.extract_image(xref)
+
+    # CMYK (often stored inverted) and other colorspaces are left to Poppler
+    if not extracted or extracted.get("colorspace") not in (1, 3):
+        return None
+    return cv2.imdecode(np.frombuffer(extracted["image"], dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def rasterize_pdf_page(pdf_path, page_num):
+    """Returns a single PDF page as a BGR array for OCR.
+
+    Scanned pages that are just one embedded image are extracted at their
+    native resolution; all other pages are rendered at 300 DPI.
+    """
+    if EXTRACT_EMBEDDED_IMAGES:
+        try:
+            cv_image = extract_embedded_page_image(pdf_path, page_num)
+        except Exception as e:
+            print(f"    - Could not extract the embedded image of page {page_num}: {e}")
+            cv_image = None
+        if cv_image is not None:
+            height, width = cv_image.shape[:2]
+            print(f"    - Extracted embedded page image ({width}x{height})")
+            return cv_image
+
+    print("    - Converting page to image (300 DPI)...")
+    page_image = convert_from_path(
+        str(pdf_path),
+        dpi=300,
+        first_page=page_num,
+        last_page=page_num
+    )[0]
+    if page_image.mode != "RGB":
+        page_image = page_image.convert("RGB")
+
+    # np.array is the only copy of the pixel buffer, the RGB -> BGR swap
+    # OpenCV/PaddleOCR expect is done in place
+    cv_image = np.array(page_image)
+    cv2.cvtColor(cv_image, cv2.COLOR_RGB2BGR, dst=cv_image)
+    return cv_image
+
+def save_page_image_async(cv_image, image_path):
+    """Writes a page image in the background so OCR does not wait for the PNG encode.
+
+    At most PAGE_IMAGE_WRITE_SLOTS images are queued at once; when the writer
+    falls behind, the caller blocks here instead of piling up pages in memory.
+    The file is written under a temporary name and renamed when complete, so
+    the resume check never picks up a half written image.
+    """
+    _page_image_write_slots.acquire()
+
+    def write():
+        try:
+            tmp_path = image_path.with_name(f"{image_path.stem}.tmp{image_path.suffix}")
+            if not cv2.imwrite(str(tmp_path), cv_image):
+                raise IOError(f"could not encode {tmp_path}")
+            os.replace(tmp_path, image_path)
+            print(f"    - Saved page image to {image_path}")
+        except Exception as e:
+            print(f"    - Error saving page image {image_path}: {e}")
+        finally:
+            _page_image_write_slots.release()
+
+    future = _page_image_writer.submit(write)
+    with _page_image_futures_lock:
+        _page_image_futures.append(future)
+
+def wait_for_page_image_writes():
+    """Blocks until every page image queued with save_page_image_async is on disk."""
+    with _page_image_futures_lock:
+        futures = list(_page_image_futures)
+        _page_image_futures.clear()
+    concurrent.futures.wait(futures)
+
+def prepare_pdf_page(pdf_path, pdf_output_dir, page_num, page_count):
+    """Rasterizes a single PDF page (unless already done) and loads it for OCR.
+
+    Returns a (cv_image, page_result_dir, basename) tuple, or None if the page
+    does not need OCR (results already exist) or could not be converted.
+    The rendered page goes to OCR straight from memory, the PNG copy is only
+    written (in the background) when save_page_images is enabled.
+    """
+    print(f"  - Processing page {page_num}/{page_count}...")
+
+    # Create a directory for the page's results
+    page_result_dir = pdf_output_dir / f"page_{page_num}_results"
+    page_result_dir.mkdir(exist_ok=True)
+
+    image_path = page_result_dir / f"page_{page_num}.png"
+    json_output_path = page_result_dir / f"page_{page_num}.json"
+
+    # Check if OCR results already exist
+    if json_output_path.exists():
+        print(f"    - OCR results already exist: {json_output_path}")
+        # The render stage still needs the page image
+        if SAVE_PAGE_IMAGES and not image_path.exists():
+            try:
+                save_page_image_async(rasterize_pdf_page(pdf_path, page_num), image_path)
+            except Exception as e:
+                print(f"    - Error converting page {page_num}: {e}")
+        return None
+
+    # Reuse the page image of an earlier run
+    if image_path.exists():
+        print(f"    - Image already exists: {image_path}")
+        cv_image = cv2.imread(str(image_path))
+        if cv_image is None:
+            print(f"    - Error: Could not read image {image_path}")
+            return None
+        return cv_image, page_result_dir, f"page_{page_num}"
+
+    try:
+        cv_image = rasterize_pdf_page(pdf_path, page_num)
+    except Exception as e:
+        print(f"    - Error converting page {page_num}: {e}")
+        return None
+
+    if SAVE_PAGE_IMAGES:
+        save_page_image_async(cv_image, image_path)
+
+    return cv_image, page_result_dir, f"page_{page_num}"
+
+def start_pdf(pdf_path):
+    """Creates the output folder of a PDF and reads its page count.
+
+    Returns (pdf_output_dir, page_count), or None if the PDF can't be read.
+    """
     print(f"Processing {pdf_path.name}...")
     pdf_output_dir = OUTPUT_DIR / pdf_path.stem
     pdf_output_dir.mkdir(exist_ok=True)
@@ -104,78 +1129,422 @@ def process_pdf(pdf_path):
         page_count = pdf_info['Pages']
     except PDFInfoNotInstalledError:
         print("Error: Poppler is not installed or not in PATH. Please install Poppler and try again.")
-        return
+        return None
 
     update_config_for_pdf(pdf_path.stem, page_count)
+    return pdf_output_dir, page_count
+
+def write_ocr_store(pdf_output_dir):
+    """Packs the page results of a document into its compact store file, if enabled."""
+    if not OCR_STORE_ENABLED:
+        return
+    try:
+        store_path = json_to_store(pdf_output_dir)
+        print(f"Saved compact OCR store to {store_path}")
+    except Exception as e:
+        print(f"Error writing the OCR store of {pdf_output_dir}: {e}")
+
+def process_pdf(pdf_path):
+    """Converts a PDF to images, saves them, resizes if necessary, and runs OCR on each page."""
+    started = start_pdf(pdf_path)
+    if started is None:
+        return
+    pdf_output_dir, page_count = started
+
+    if PIPELINE_ENABLED:
+        process_pdf_pipelined(pdf_path, pdf_output_dir, page_count)
+        wait_for_page_image_writes()
+        close_pdf_document(pdf_path)
+        write_ocr_store(pdf_output_dir)
+        return
 
     # Process one page at a time to save memory
-    for page_num in range(1, page_count + 1):
-        print(f"  - Processing page {page_num}/{page_count}...")
+    ocr_pages_in_batches(
+        prepare_pdf_page(pdf_path, pdf_output_dir, page_num, page_count)
+        for page_num in range(1, page_count + 1)
+    )
+    wait_for_page_image_writes()
+    close_pdf_document(pdf_path)
+    write_ocr_store(pdf_output_dir)
+
+def ocr_pages_in_batches(prepared_pages):
+    """Runs OCR on prepared pages, OCR_BATCH_SIZE at a time.
+
+    `prepared_pages` yields (cv_image, page_result_dir, basename) tuples, or
+    None for pages that need no OCR. It is consumed lazily, so at most
+    OCR_BATCH_SIZE pages are kept in memory at once.
+    """
+    pending_images, pending_dirs, pending_basenames = [], [], []
+    for prepared in prepared_pages:
+        if prepared is None:
+            continue
+
+        cv_image, page_result_dir, basename = prepared
+        pending_images.append(cv_image)
+        pending_dirs.append(page_result_dir)
+        pending_basenames.append(basename)
+
+        if len(pending_images) >= OCR_BATCH_SIZE:
+            run_ocr_batch_and_save_results(pending_images, pending_dirs, pending_basenames)
+            pending_images, pending_dirs, pending_basenames = [], [], []
 
-        # Create a directory for the page's results
-        page_result_dir = pdf_output_dir / f"page_{page_num}_results"
-        page_result_dir.mkdir(exist_ok=True)
+    # Flush the last, possibly partial, batch
+    if pending_images:
+        run_ocr_batch_and_save_results(pending_images, pending_dirs, pending_basenames)
 
-        # Convert and save only the current page
-        image_path = page_result_dir / f"page_{page_num}.png"
+def process_pdf_pipelined(pdf_path, pdf_output_dir, page_count):
+    """Rasterizes and OCRs the pages of a PDF concurrently.
 
-        # Only convert if the image doesn't already exist
-        if not image_path.exists():
-            print("    - Converting page to image (300 DPI)...")
+    A pool of rasterizer threads converts pages and puts them on a bounded
+    queue, while OCR worker threads take pages off the queue (in batches of
+    OCR_BATCH_SIZE). pdftoppm runs in its own process, so rendering the next
+    pages overlaps with OCR of the current ones. The queue depth bounds how
+    many decoded pages can be waiting in memory at once.
+    """
+    page_numbers = iter(range(1, page_count + 1))
+    page_numbers_lock = threading.Lock()
+    page_queue = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+    # Set when no OCR worker is left to take pages, so nobody blocks on the full queue
+    stop = threading.Event()
+    # Set once every page has been put on the queue
+    rasterized = threading.Event()
+    alive_workers = [PIPELINE_OCR_WORKERS]
+
+    def put_page(item):
+        """Puts an item on the queue, gives up once the pipeline is stopped."""
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def rasterizer():
+        while not stop.is_set():
+            with page_numbers_lock:
+                page_num = next(page_numbers, None)
+            if page_num is None:
+                return
             try:
-                page_image = convert_from_path(
-                    str(pdf_path),
-                    dpi=300,
-                    first_page=page_num,
-                    last_page=page_num
-                )[0]
-                page_image.save(image_path, "PNG")
-                print(f"    - Saved page image to {image_path}")
+                prepared = prepare_pdf_page(pdf_path, pdf_output_dir, page_num, page_count)
             except Exception as e:
-                print(f"    - Error converting page {page_num}: {e}")
+                print(f"    - Error preparing page {page_num}: {e}")
                 continue
-        else:
-            print(f"    - Image already exists: {image_path}")
+            if prepared is not None:
+                # Blocks while the queue is full, so rasterizers never run
+                # more than PIPELINE_QUEUE_DEPTH pages ahead of OCR
+                put_page(prepared)
 
-        # Check if OCR results already exist
-        json_output_path = page_result_dir / f"page_{page_num}.json"
-        if json_output_path.exists():
-            print(f"    - OCR results already exist: {json_output_path}")
-            continue
+    def ocr_worker(worker_index):
+        # PaddleOCR instances are not safe to share between threads, so every
+        # extra OCR worker loads its own engine
+        try:
+            engine = get_ocr_engine() if worker_index == 0 else create_ocr_engine()
+        except Exception as e:
+            print(f"    - Error loading the OCR model for worker {worker_index + 1}: {e}")
+            with page_numbers_lock:
+                alive_workers[0] -= 1
+                if alive_workers[0] == 0:
+                    print("    - No OCR worker left, stopping the pipeline.")
+                    stop.set()
+            return
 
-        # Run OCR on the saved image
-        cv_image = cv2.imread(str(image_path))
-        if cv_image is None:
-            print(f"    - Error: Could not read image {image_path}")
-            continue
+        pending = []
+        while True:
+            try:
+                item = page_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not rasterized.is_set():
+                    continue
+                item = None  # the queue is drained and no more pages are coming
+            if item is not None:
+                pending.append(item)
+            if pending and (item is None or len(pending) >= OCR_BATCH_SIZE):
+                images, dirs, basenames = zip(*pending)
+                try:
+                    run_ocr_batch_and_save_results(list(images), list(dirs), list(basenames), engine=engine)
+                except Exception as e:
+                    print(f"    - Error running OCR on {', '.join(basenames)}: {e}")
+                pending = []
+            if item is None:
+                return
 
-        run_ocr_and_save_results(cv_image, page_result_dir, basename=f"page_{page_num}")
+    rasterizers = [threading.Thread(target=rasterizer, daemon=True) for _ in range(PIPELINE_RASTERIZER_WORKERS)]
+    ocr_workers = [threading.Thread(target=ocr_worker, args=(i,), daemon=True) for i in range(PIPELINE_OCR_WORKERS)]
+    for thread in rasterizers + ocr_workers:
+        thread.start()
 
+    for thread in rasterizers:
+        thread.join()
+    rasterized.set()
+    for thread in ocr_workers:
+        thread.join()
 
-def process_docx(docx_path):
-    """Converts a DOCX file to PDF and then processes it."""
+
+def convert_docx_to_pdf(docx_path):
+    """Converts a DOCX file to PDF, returns the PDF path or None on failure."""
     print(f"Converting {docx_path.name} to PDF...")
     pdf_path = OUTPUT_DIR / f"{docx_path.stem}.pdf"
     try:
         convert(str(docx_path), str(pdf_path))
         print(f"Successfully converted to {pdf_path.name}")
-        process_pdf(pdf_path)
+        return pdf_path
     except Exception as e:
         print(f"Error converting {docx_path.name} to PDF: {e}")
         print("Please ensure you have LibreOffice or Microsoft Office installed.")
+        return None
 
-def main():
-    """Finds and processes all supported files in the input directory."""
-    print("Starting file processing...")
+def find_docx_page_images(docx_path):
+    """Lists the images pasted into a DOCX file, in document order.
+
+    A DOCX file is a zip archive; the images referenced from
+    word/document.xml (DrawingML blips and legacy VML image data) are looked
+    up in its relationships. Returns the archive member names, or None if the
+    document has more than DOCX_MAX_TEXT_CHARS characters of real text or
+    contains an image OpenCV cannot decode (EMF/WMF drawings are common in
+    Word files) and should be converted through an office suite instead.
+    """
+    with zipfile.ZipFile(docx_path) as archive:
+        document = ElementTree.fromstring(archive.read("word/document.xml"))
+        relationships = ElementTree.fromstring(archive.read("word/_rels/document.xml.rels"))
+
+    text_chars = sum(len(node.text or "") for node in document.iter(f"{{{WORD_NS}}}t"))
+    if text_chars > DOCX_MAX_TEXT_CHARS:
+        return None
+
+    targets = {}
+    for relationship in relationships:
+        if relationship.get("Type", "").endswith("/image") and relationship.get("TargetMode") != "External":
+            target = relationship.get("Target", "")
+            targets[relationship.get("Id")] = target.lstrip("/") if target.startswith("/") else f"word/{target}"
+
+    members = []
+    for node in document.iter():
+        if node.tag in (f"{{{DRAWING_NS}}}blip", f"{{{VML_NS}}}imagedata"):
+            rel_id = node.get(f"{{{RELATIONSHIP_NS}}}embed") or node.get(f"{{{RELATIONSHIP_NS}}}id")
+            if rel_id in targets:
+                members.append(targets[rel_id])
+
+    with zipfile.ZipFile(docx_path) as archive:
+        for member in dict.fromkeys(members):
+            data = np.frombuffer(archive.read(member), dtype=np.uint8)
+            # A reduced decode is enough to tell whether the format is readable
+            if data.size == 0 or cv2.imdecode(data, cv2.IMREAD_REDUCED_GRAYSCALE_8) is None:
+                print(f"  - {member} in {Path(docx_path).name} cannot be decoded, converting the document instead.")
+                return None
+    return members
+
+def prepare_docx_page(docx_path, member, docx_output_dir, page_num, page_count):
+    """Decodes one image of a DOCX file as a page, like prepare_pdf_page does for PDFs."""
+    print(f"  - Processing page {page_num}/{page_count}...")
+    page_result_dir = docx_output_dir / f"page_{page_num}_results"
+    page_result_dir.mkdir(exist_ok=True)
+    image_path = page_result_dir / f"page_{page_num}.png"
+    json_output_path = page_result_dir / f"page_{page_num}.json"
+
+    if json_output_path.exists() and (image_path.exists() or not SAVE_PAGE_IMAGES):
+        print(f"    - OCR results already exist: {json_output_path}")
+        return None
+
+    with zipfile.ZipFile(docx_path) as archive:
+        data = archive.read(member)
+    cv_image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if cv_image is None:
+        print(f"    - Error: Could not decode {member}")
+        return None
+
+    if SAVE_PAGE_IMAGES and not image_path.exists():
+        save_page_image_async(cv_image, image_path)
+    if json_output_path.exists():
+        print(f"    - OCR results already exist: {json_output_path}")
+        return None
+    return cv_image, page_result_dir, f"page_{page_num}"
+
+def process_docx(docx_path):
+    """OCRs the images pasted into a DOCX file directly, one page per image.
+
+    Scanlation DOCX files are usually just page images, so they are read
+    straight from the archive at their original resolution. Documents with
+    real text (or without images) are converted to PDF and processed as
+    such, which needs LibreOffice or Microsoft Office.
+    """
+    try:
+        members = find_docx_page_images(docx_path)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        print(f"Could not read the images of {docx_path.name}: {e}")
+        members = None
+
+    if not members:
+        pdf_path = convert_docx_to_pdf(docx_path)
+        if pdf_path is not None:
+            process_pdf(pdf_path)
+        return
+
+    print(f"Processing {docx_path.name} ({len(members)} embedded page images)...")
+    docx_output_dir = OUTPUT_DIR / docx_path.stem
+    docx_output_dir.mkdir(exist_ok=True)
+    update_config_for_pdf(docx_path.stem, len(members))
+
+    page_count = len(members)
+    ocr_pages_in_batches(
+        prepare_docx_page(docx_path, member, docx_output_dir, page_num, page_count)
+        for page_num, member in enumerate(members, start=1)
+    )
+    wait_for_page_image_writes()
+    write_ocr_store(docx_output_dir)
+
+def find_input_files():
+    """Returns all supported files in the input directory."""
     supported_extensions = ["*.pdf", "*.png", "*.jpg", "*.jpeg", "*.docx"]
     files_to_process = []
     for ext in supported_extensions:
         files_to_process.extend(INPUT_DIR.glob(ext))
+    return files_to_process
+
+def build_work_list(files_to_process):
+    """Expands the input files into one OCR task per image or PDF page.
+
+    Tasks are plain tuples so they can be sent to worker processes:
+    ("image", path), ("pdf_page", pdf_path, page_num, page_count) or
+    ("docx_page", docx_path, page_num, page_count, archive member).
+    """
+    tasks = []
+    for file_path in files_to_process:
+        ext = file_path.suffix.lower()
+        if ext in [".png", ".jpg", ".jpeg"]:
+            tasks.append(("image", str(file_path)))
+            continue
+
+        if ext == ".docx":
+            try:
+                members = find_docx_page_images(file_path)
+            except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+                print(f"Could not read the images of {file_path.name}: {e}")
+                members = None
+            if members:
+                (OUTPUT_DIR / file_path.stem).mkdir(exist_ok=True)
+                update_config_for_pdf(file_path.stem, len(members))
+                for page_num, member in enumerate(members, start=1):
+                    tasks.append(("docx_page", str(file_path), page_num, len(members), member))
+                continue
+            file_path = convert_docx_to_pdf(file_path)
+            if file_path is None:
+                continue
+
+        started = start_pdf(file_path)
+        if started is None:
+            continue
+        _, page_count = started
+        for page_num in range(1, page_count + 1):
+            tasks.append(("pdf_page", str(file_path), page_num, page_count))
+    return tasks
+
+def run_ocr_task(task):
+    """Runs a single task from build_work_list in the current process.
+
+    Returns the pre-filter counts of this task so the parent can report totals.
+    """
+    stats_before = dict(PREFILTER_STATS)
+    kind, path = task[0], Path(task[1])
+    if kind == "image":
+        process_image(path)
+    else:
+        page_num, page_count = task[2], task[3]
+        if kind == "docx_page":
+            prepared = prepare_docx_page(path, task[4], OUTPUT_DIR / path.stem, page_num, page_count)
+        else:
+            prepared = prepare_pdf_page(path, OUTPUT_DIR / path.stem, page_num, page_count)
+        if prepared is not None:
+            cv_image, page_result_dir, basename = prepared
+            run_ocr_and_save_results(cv_image, page_result_dir, basename=basename)
+    # Pool workers exit without running atexit handlers, flush before returning
+    wait_for_page_image_writes()
+    return {k: PREFILTER_STATS[k] - stats_before[k] for k in stats_before}
+
+def split_cores(workers):
+    """Splits the cores available to this process into one slice per worker."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+
+    per_worker = max(1, len(cores) // workers)
+    slices = []
+    for i in range(workers):
+        core_slice = cores[i * per_worker:(i + 1) * per_worker]
+        # More workers than cores: workers share cores round-robin
+        slices.append(core_slice or [cores[i % len(cores)]])
+    # Give the remainder of an uneven split to the last worker
+    if len(cores) > per_worker * workers:
+        slices[-1] = slices[-1] + cores[per_worker * workers:]
+    return slices
+
+def init_ocr_worker(core_slices, worker_counter):
+    """Pins a worker process to its core slice and loads its OCR model once."""
+    global _ocr_engine
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+
+    cores = core_slices[worker_index % len(core_slices)]
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    _ocr_engine = create_ocr_engine(cpu_threads=len(cores))
+    print(f"Worker {worker_index} (pid {os.getpid()}) loaded the OCR model on cores {cores}")
+
+def process_with_workers(files_to_process, workers):
+    """Spreads the pages of all input files over a pool of OCR worker processes.
+
+    Every worker loads the model once and is pinned to its own slice of
+    cores. Pages are handed out one at a time from a shared work list, so
+    fast workers simply pick up more pages. Results are written by the same
+    functions as in the serial run, so the output is identical.
+    """
+    tasks = build_work_list(files_to_process)
+    if not tasks:
+        return
+
+    core_slices = split_cores(workers)
+    # spawn instead of fork: the parent has already imported paddle and
+    # forking a process with a live inference runtime is not safe
+    context = multiprocessing.get_context("spawn")
+    worker_counter = context.Value("i", 0)
+    print(f"Starting {workers} OCR workers for {len(tasks)} pages...")
+    with context.Pool(workers, initializer=init_ocr_worker, initargs=(core_slices, worker_counter)) as pool:
+        for task_stats in pool.imap_unordered(run_ocr_task, tasks, chunksize=1):
+            for k, v in task_stats.items():
+                PREFILTER_STATS[k] += v
+
+    for document_path in sorted({task[1] for task in tasks if task[0] in ("pdf_page", "docx_page")}):
+        write_ocr_store(OUTPUT_DIR / Path(document_path).stem)
+
+def main():
+    """Finds and processes all supported files in the input directory."""
+    parser = argparse.ArgumentParser(description="Runs OCR on every supported file in the input directory.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of OCR worker processes, each with its own model and core slice")
+    parser.add_argument("--rec-only", nargs="?", const=str(OUTPUT_DIR), metavar="DIR",
+                        help="skip detection and re-run recognition on the stored text boxes of every page in DIR (default: output/)")
+    args = parser.parse_args()
+
+    if args.rec_only:
+        recognize_from_detections(Path(args.rec_only))
+        print("Processing complete.")
+        return
+
+    print("Starting file processing...")
+    files_to_process = find_input_files()
 
     if not files_to_process:
         print(f"No supported files found in '{INPUT_DIR}' directory.")
         return
 
+    if args.workers > 1:
+        process_with_workers(files_to_process, args.workers)
+        report_prefilter_stats()
+        print("Processing complete.")
+        return
+
     for file_path in files_to_process:
         ext = file_path.suffix.lower()
         if ext == ".pdf":
@@ -185,7 +1554,8 @@ def main():
         elif ext == ".docx":
             process_docx(file_path)
     
+    report_prefilter_stats()
     print("Processing complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Puts between two rescans of the cache directory, so entries written by other
+# worker processes are counted even while this process stays below the cap
+RESCAN_INTERVAL = 256
+# An eviction frees space down to this share of the cap, so a full cache is
+# not rescanned on every put
+EVICT_TO = 0.9
+
+class OCRCache:
+    """On-disk cache of OCR results, keyed on the decoded page pixels and the OCR settings.
+
+    Every entry is the JSON file written by PaddleOCR for one page, stored as
+    `<key>.json` in `cache_dir`. The key is a hash of the image buffer (shape,
+    dtype and pixels) plus the OCR parameters, so a renamed or re-uploaded
+    page hits the cache while a change of `lang` and the like does not.
+
+    The total size of the cache is capped at `max_bytes`; the least recently
+    used entries are evicted first. Recency is kept in the file mtimes, so it
+    survives between runs. A running total of the cache size is kept, so a
+    put does not have to list the directory. Several processes
+    (`--workers N`) may share the cache directory, so the size and LRU order
+    are read from the directory itself whenever the running total passes the
+    cap and every RESCAN_INTERVAL puts; between rescans the cache can exceed
+    the cap by what the other processes wrote meanwhile.
+    """
+
+    def __init__(self, cache_dir, max_bytes, params):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._params = json.dumps(params, sort_keys=True).encode("utf-8")
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._puts_since_scan = 0
+        with self._lock:
+            self._evict()
+
+    def _scan(self):
+        """Returns (mtime, key, size) of every entry in the cache directory, least recently used first."""
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process meanwhile
+                found.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+        return sorted(found)
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def key_for(self, image):
+        """Returns the cache key of a decoded image (numpy array) under the current OCR settings."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self._params)
+        digest.update(f"{image.shape}{image.dtype}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def get(self, key, json_output_path):
+        """Copies the cached result for `key` to `json_output_path`, returns False on a miss."""
+        cached_path = self._path(key)
+        try:
+            shutil.copyfile(cached_path, json_output_path)
+            os.utime(cached_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put(self, key, json_path):
+        """Stores the result file `json_path` under `key`."""
+        size = os.path.getsize(json_path)
+        if size > self.max_bytes:
+            return
+
+        # Write to a temporary file first so readers never see a partial entry
+        cached_path = self._path(key)
+        tmp_path = cached_path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(json_path, tmp_path)
+        os.replace(tmp_path, cached_path)
+
+        with self._lock:
+            self._total_bytes += size
+            self._puts_since_scan += 1
+            if self._total_bytes > self.max_bytes or self._puts_since_scan >= RESCAN_INTERVAL:
+                self._evict()
+
+    def _evict(self):
+        """Rescans the cache directory and drops least recently used entries if it exceeds max_bytes (lock held)."""
+        entries = self._scan()
+        total_bytes = sum(size for _, _, size in entries)
+        target_bytes = self.max_bytes * EVICT_TO if total_bytes > self.max_bytes else total_bytes
+        for _, key, size in entries:
+            if total_bytes <= target_bytes:
+                break
+            total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total_bytes
+        self._puts_since_scan = 0
@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import mmap
+import struct
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Compact columnar store for the OCR results of one document.
+#
+# Layout (all integers little endian):
+#
+#   header   MAGIC, version (u32), page count (u32), index offset (u64)
+#   columns  raw column data of every page, 8 byte aligned
+#   index    one entry per page: page number (u32), line count (u32),
+#            then (offset u64, length u64) for each field in FIELDS
+#
+# The index has a fixed entry size, so reading one page or one field of a page
+# only touches the header, one index entry and that field's bytes.
+#
+# Fields of a page with n lines:
+#   poly_sizes  u16[n]          number of points of every polygon
+#   polys       i32[sum(sizes) * 2]  x, y of all polygon points, flattened
+#   boxes       i32[n * 4]      x0, y0, x1, y1
+#   scores      f32[n]
+#   text_ends   u32[n]          end offset of every text in the text table
+#   texts       utf-8 bytes     all texts concatenated (the string table)
+#   dt_poly_sizes, dt_polys     the detection polygons, laid out like polys
+#   angles      i16[m]          textline_orientation_angles
+#   extra       utf-8 JSON      every other key of the page JSON
+#
+# A store is only used while it is at least as new as every page JSON of its
+# document (see load_fresh_store); anything that rewrites the JSON files
+# calls refresh_store afterwards.
+
+MAGIC = b"MTOCRST\0"
+VERSION = 2
+FIELDS = ("poly_sizes", "polys", "boxes", "scores", "text_ends", "texts",
+          "dt_poly_sizes", "dt_polys", "angles", "extra")
+HEADER = struct.Struct("<8sIIQ")
+INDEX_ENTRY = struct.Struct("<II" + "QQ" * len(FIELDS))
+COLUMN_KEYS = ("rec_polys", "rec_boxes", "rec_scores", "rec_texts", "dt_polys", "textline_orientation_angles")
+# Keys that are only written back by OCRStore.page when the page JSON had them
+OPTIONAL_COLUMN_KEYS = ("dt_polys", "textline_orientation_angles")
+STORE_FILENAME = "ocr_results.mtocr"
+
+_PAGE_DIR_PATTERN = re.compile(r"page_(\d+)_results$")
+
+
+def encode_polys(polys):
+    """Returns the (sizes, flattened points) buffers of a list of polygons."""
+    polys = [np.asarray(poly, dtype=np.int32).reshape(-1, 2) for poly in polys]
+    sizes = np.array([len(poly) for poly in polys], dtype=np.uint16)
+    points = np.concatenate(polys).ravel() if polys else np.zeros(0, dtype=np.int32)
+    return sizes.tobytes(), points.astype(np.int32).tobytes()
+
+
+def encode_page(data):
+    """Turns one page result dict into its column buffers, in FIELDS order."""
+    texts = [text.encode("utf-8") for text in data.get("rec_texts", [])]
+    extra = {k: v for k, v in data.items() if k not in COLUMN_KEYS}
+    present = [key for key in OPTIONAL_COLUMN_KEYS if key in data and data[key] is not None]
+    if present:
+        extra["_stored_columns"] = present
+
+    boxes = np.asarray(data.get("rec_boxes", []), dtype=np.int32).reshape(-1, 4)
+    scores = np.asarray(data.get("rec_scores", []), dtype=np.float32)
+    text_ends = np.cumsum([len(text) for text in texts], dtype=np.uint32)
+    angles = np.asarray(data.get("textline_orientation_angles") or [], dtype=np.int16)
+
+    return [
+        *encode_polys(data.get("rec_polys", [])),
+        boxes.tobytes(),
+        scores.tobytes(),
+        text_ends.tobytes(),
+        b"".join(texts),
+        *encode_polys(data.get("dt_polys") or []),
+        angles.tobytes(),
+        json.dumps(extra, ensure_ascii=False).encode("utf-8"),
+    ], len(texts)
+
+
+def write_store(pages, store_path):
+    """Writes a store file from an iterable of (page number, page result dict) pairs."""
+    index = []
+    tmp_path = Path(store_path).with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for page_num, data in pages:
+            buffers, line_count = encode_page(data)
+            spans = []
+            for buffer in buffers:
+                # Keep every column 8 byte aligned so numpy can view it in place
+                f.write(b"\0" * (-f.tell() % 8))
+                spans.extend((f.tell(), len(buffer)))
+                f.write(buffer)
+            index.append(INDEX_ENTRY.pack(page_num, line_count, *spans))
+
+        f.write(b"\0" * (-f.tell() % 8))
+        index_offset = f.tell()
+        f.write(b"".join(index))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), index_offset))
+    os.replace(tmp_path, store_path)
+
+
+class OCRStore:
+    """Read access to a store file, mapped into memory and decoded lazily per page and field."""
+
+    def __init__(self, store_path):
+        self.store_path = Path(store_path)
+        with open(self.store_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, page_count, index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.store_path} is not an OCR store (version {VERSION})")
+
+        # Only the page numbers are decoded up front, entries are read on demand
+        self._index_offset = index_offset
+        self._entry_of_page = {}
+        for i in range(page_count):
+            page_num, = struct.unpack_from("<I", self._map, index_offset + i * INDEX_ENTRY.size)
+            self._entry_of_page[page_num] = i
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pages(self):
+        """Returns the page numbers in the store, in stored order."""
+        return list(self._entry_of_page)
+
+    def _entry(self, page_num):
+        offset = self._index_offset + self._entry_of_page[page_num] * INDEX_ENTRY.size
+        values = INDEX_ENTRY.unpack_from(self._map, offset)
+        spans = dict(zip(FIELDS, zip(values[2::2], values[3::2])))
+        return values[1], spans
+
+    def _column(self, page_num, field, dtype):
+        _, spans = self._entry(page_num)
+        offset, length = spans[field]
+        return np.frombuffer(self._map, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def line_count(self, page_num):
+        return self._entry(page_num)[0]
+
+    def texts(self, page_num):
+        """Returns the rec_texts of a page."""
+        _, spans = self._entry(page_num)
+        offset, length = spans["texts"]
+        blob = self._map[offset:offset + length]
+        ends = self._column(page_num, "text_ends", np.uint32)
+        starts = np.concatenate(([0], ends[:-1])) if len(ends) else ends
+        return [blob[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+
+    def scores(self, page_num):
+        """Returns the rec_scores of a page as a float32 array (a view into the file)."""
+        return self._column(page_num, "scores", np.float32)
+
+    def boxes(self, page_num):
+        """Returns the rec_boxes of a page as an (n, 4) int32 array (a view into the file)."""
+        return self._column(page_num, "boxes", np.int32).reshape(-1, 4)
+
+    def _polys(self, page_num, prefix):
+        sizes = self._column(page_num, f"{prefix}poly_sizes", np.uint16)
+        points = self._column(page_num, f"{prefix}polys", np.int32).reshape(-1, 2)
+        return np.split(points, np.cumsum(sizes)[:-1]) if len(sizes) else []
+
+    def polys(self, page_num):
+        """Returns the rec_polys of a page as a list of (k, 2) int32 arrays."""
+        return self._polys(page_num, "")
+
+    def dt_polys(self, page_num):
+        """Returns the dt_polys (detection polygons) of a page as a list of (k, 2) int32 arrays."""
+        return self._polys(page_num, "dt_")
+
+    def angles(self, page_num):
+        """Returns the textline_orientation_angles of a page as an int16 array (a view into the file)."""
+        return self._column(page_num, "angles", np.int16)
+
+    def extra(self, page_num):
+        """Returns all other fields of the original page JSON."""
+        _, spans = self._entry(page_num)
+        offset, length = spans["extra"]
+        return json.loads(self._map[offset:offset + length].decode("utf-8"))
+
+    def page(self, page_num):
+        """Rebuilds the full page result dict, in the layout of the page JSON."""
+        data = self.extra(page_num)
+        present = data.pop("_stored_columns", [])
+        data["rec_texts"] = self.texts(page_num)
+        data["rec_scores"] = self.scores(page_num).tolist()
+        data["rec_polys"] = [poly.tolist() for poly in self.polys(page_num)]
+        data["rec_boxes"] = self.boxes(page_num).tolist()
+        if "dt_polys" in present:
+            data["dt_polys"] = [poly.tolist() for poly in self.dt_polys(page_num)]
+        if "textline_orientation_angles" in present:
+            data["textline_orientation_angles"] = self.angles(page_num).tolist()
+        return data
+
+
+def find_page_results(doc_dir):
+    """Returns (page number, page JSON path) pairs of a document folder, in page order."""
+    pages = []
+    for page_dir in Path(doc_dir).iterdir():
+        match = _PAGE_DIR_PATTERN.match(page_dir.name)
+        json_path = page_dir / f"page_{match.group(1)}.json" if match else None
+        if json_path is not None and json_path.exists():
+            pages.append((int(match.group(1)), json_path))
+    return sorted(pages)
+
+
+def json_to_store(doc_dir, store_path=None):
+    """Packs the page_N.json files of a document folder into one store file."""
+    doc_dir = Path(doc_dir)
+    store_path = Path(store_path) if store_path else doc_dir / STORE_FILENAME
+
+    def pages():
+        for page_num, json_path in find_page_results(doc_dir):
+            with open(json_path, "r", encoding="utf-8") as f:
+                yield page_num, json.load(f)
+
+    write_store(pages(), store_path)
+    return store_path
+
+
+def load_fresh_store(doc_dir):
+    """Opens the store of a document folder, or returns None if it is missing or stale.
+
+    A store is stale when any page JSON is newer than it (e.g. after
+    translation or a recognition-only run rewrote the JSON files) or when the
+    set of pages differs.
+    """
+    doc_dir = Path(doc_dir)
+    store_path = doc_dir / STORE_FILENAME
+    try:
+        store_mtime = store_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    pages = find_page_results(doc_dir)
+    if any(json_path.stat().st_mtime_ns > store_mtime for _, json_path in pages):
+        return None
+    try:
+        store = OCRStore(store_path)
+    except (OSError, ValueError, struct.error):
+        return None  # written by an older version or truncated
+    if sorted(store.pages()) != [page_num for page_num, _ in pages]:
+        store.close()
+        return None
+    return store
+
+
+def refresh_store(doc_dir):
+    """Rebuilds the store of a document folder after its JSON files changed, if it has one."""
+    doc_dir = Path(doc_dir)
+    if (doc_dir / STORE_FILENAME).exists():
+        return json_to_store(doc_dir)
+    return None
+
+
+def refresh_stores_below(root):
+    """Rebuilds every store below `root` (and `root` itself), returns the rebuilt paths."""
+    return [refresh_store(store_path.parent) for store_path in Path(root).rglob(STORE_FILENAME)]
+
+
+def store_to_json(store_path, doc_dir):
+    """Writes every page of a store back as output/<doc>/page_N_results/page_N.json."""
+    doc_dir = Path(doc_dir)
+    with OCRStore(store_path) as store:
+        for page_num in store.pages():
+            page_dir = doc_dir / f"page_{page_num}_results"
+            page_dir.mkdir(parents=True, exist_ok=True)
+            with open(page_dir / f"page_{page_num}.json", "w", encoding="utf-8") as f:
+                json.dump(store.page(page_num), f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts OCR results between page JSON files and a compact store file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack = subparsers.add_parser("pack", help="page_N.json files of a document folder -> store file")
+    pack.add_argument("doc_dir")
+    pack.add_argument("store_path", nargs="?")
+    unpack = subparsers.add_parser("unpack", help="store file -> page_N.json files")
+    unpack.add_argument("store_path")
+    unpack.add_argument("doc_dir")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        print(f"Wrote {json_to_store(args.doc_dir, args.store_path)}")
+    else:
+        store_to_json(args.store_path, args.doc_dir)
+        print(f"Wrote page JSON files to {args.doc_dir}")
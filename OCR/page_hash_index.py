@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def dhash(image, hash_size=16):
+    """Returns the difference hash of an image as a packed uint8 array of hash_size**2 bits.
+
+    The page is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and every bit says whether a pixel is brighter than its right neighbour.
+    Re-encoded, rescaled or slightly shifted copies of a page give hashes that
+    differ in only a few bits.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thumbnail = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return np.packbits(thumbnail[:, 1:] > thumbnail[:, :-1])
+
+
+class PageHashIndex:
+    """Persistent index of the perceptual hashes of OCR'd pages, shared by all documents.
+
+    Entries are appended to a JSON lines file, one line per page with its
+    hash, image shape, the path of its OCR result (relative to
+    `results_root`) and a digest of the OCR settings it was made with, so the
+    index survives between runs and grows over a whole series. Only entries
+    made with the current settings (`params`) are ever matched.
+    """
+
+    def __init__(self, index_path, results_root, max_distance, params, hash_size=16):
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.results_root = Path(results_root)
+        self.max_distance = max_distance
+        self.params = hashlib.blake2b(json.dumps(params, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+        self.hash_size = hash_size
+        self._lock = threading.Lock()
+        # Grown by doubling, only the first len(self._entries) rows are used
+        self._hashes = np.zeros((64, hash_size * hash_size // 8), dtype=np.uint8)
+        self._entries = []
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        hashes = []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    page_hash = np.frombuffer(bytes.fromhex(entry["hash"]), dtype=np.uint8)
+                except (ValueError, KeyError):
+                    continue  # partially written line of an interrupted run
+                if len(page_hash) != self._hashes.shape[1] or entry.get("params") != self.params:
+                    continue  # written with a different hash size or other OCR settings
+                hashes.append(page_hash)
+                self._entries.append(entry)
+        if hashes:
+            self._hashes = np.concatenate([np.stack(hashes), self._hashes])
+
+    def hash_image(self, image):
+        return dhash(image, self.hash_size)
+
+    def find(self, page_hash, shape, confirm=None):
+        """Returns (result path, shape) of the closest known page within max_distance, or None.
+
+        Only pages with (nearly) the same aspect ratio qualify, so their
+        coordinates can be scaled onto the new page. A small hash cannot tell
+        apart pages with the same art and different text, so every candidate
+        is passed to `confirm(result path, shape)` for a real check, if given.
+        """
+        with self._lock:
+            if not self._entries:
+                return None
+            known = self._hashes[:len(self._entries)]
+            distances = np.unpackbits(known ^ page_hash, axis=1).sum(axis=1)
+            candidates = np.flatnonzero(distances <= self.max_distance)
+            candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+            entries = [self._entries[i] for i in candidates]
+
+        aspect = shape[1] / shape[0]
+        for entry in entries:
+            known_height, known_width = entry["shape"]
+            if abs(known_width / known_height - aspect) > 0.02 * aspect:
+                continue
+            json_path = self.results_root / entry["json_path"]
+            if json_path.exists() and (confirm is None or confirm(json_path, entry["shape"])):
+                return json_path, entry["shape"]
+        return None
+
+    def add(self, page_hash, shape, json_path):
+        """Adds an OCR'd page to the index and appends it to the index file."""
+        entry = {
+            "hash": page_hash.tobytes().hex(),
+            "shape": list(shape[:2]),
+            "json_path": Path(os.path.relpath(json_path, self.results_root)).as_posix(),
+            "params": self.params,
+        }
+        with self._lock:
+            count = len(self._entries)
+            if count == len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+            self._hashes[count] = page_hash
+            self._entries.append(entry)
+            # One short line per write, appends from several processes don't interleave
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
@@ -11,6 +11,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from translation_memory import memory_from_config
+
 BING_LANGUAGES = {
         "af": "Afrikaans", "am": "Amharic", "ar": "Arabic", "as": "Assamese", "az": "Azerbaijani",
         "ba": "Bashkir", "be": "Belarusian", "bg": "Bulgarian", "bho": "Bhojpuri", "bn": "Bangla",
@@ -47,17 +49,26 @@ BING_LANGUAGES = {
     }
 
 class BingTranslator:
-    def __init__(self, browser, logger, to_lan, from_lan='auto'):
+    def __init__(self, browser, logger, to_lan, from_lan='auto', memory=None):
         self.browser = browser
         self.logger = logger
-        self.content = ""   # store the translations for future database implementation
+        self.content = ""
+        self.memory = memory
+        self.from_lan = from_lan
+        self.to_lan = to_lan
         if to_lan not in BING_LANGUAGES:
             raise ValueError(f"Invalid 'to' language: {to_lan}")
         if from_lan != 'auto' and from_lan not in BING_LANGUAGES:
             raise ValueError(f"Invalid 'from' language: {from_lan}")
         self.url = f"https://www.bing.com/translator?from={from_lan}&to={to_lan}"
 
-    def bing(self,content):
+    def bing(self, content):
+        '''Translates content, answering from the translation memory if one is given.'''
+        if self.memory is None:
+            return self._bing(content)
+        return self.memory.translate_cached("bing", self.from_lan, self.to_lan, content, self._bing)
+
+    def _bing(self,content):
         '''
         This is designed to be a seperate file in the future, so when the webscraper fails , only this function needs to be changed  
         '''
@@ -132,7 +143,9 @@ if __name__ == '__main__':
 
     # initialise webdriver and performing translation
     driver = None
+    memory = None
     if content_to_translate:
+        memory = memory_from_config(config)
         options = Options()
         options.add_argument("-profile")
         options.add_argument(FIREFOX_PROFILE_PATH)
@@ -143,7 +156,7 @@ if __name__ == '__main__':
             driver = webdriver.Firefox(service = service,options = options)
             logger.info("driver initialized")
 
-            translator = BingTranslator(driver, logger, to_lan=to_lan, from_lan=from_lan)
+            translator = BingTranslator(driver, logger, to_lan=to_lan, from_lan=from_lan, memory=memory)
             result = translator.bing(content_to_translate)
 
             with open('result.txt',"w",encoding = "utf-8") as f:
@@ -157,6 +170,9 @@ if __name__ == '__main__':
             if driver:
                 logger.info("closing the browser")
                 driver.quit()
+            if memory is not None:
+                memory.report(logger)
+                memory.close()
             logger.info("script complete")
     else:
         logger.info("no content to translate, script complete")
\ No newline at end of file
@@ -11,14 +11,25 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from translation_memory import memory_from_config
+
 class CaiyunTranslator:
-    def __init__(self, browser, logger):
+    def __init__(self, browser, logger, memory=None):
         self.browser = browser
         self.logger = logger
         self.content = ""
+        self.memory = memory
+        self.from_lan = "auto"
+        self.to_lan = "default"  # the site's own language pair
         self.url = "https://fanyi.caiyunapp.com/"
 
     def caiyun(self, content):
+        '''Translates content, answering from the translation memory if one is given.'''
+        if self.memory is None:
+            return self._caiyun(content)
+        return self.memory.translate_cached("caiyun", self.from_lan, self.to_lan, content, self._caiyun)
+
+    def _caiyun(self, content):
         """
         Translates the given content using Caiyun Translator.
         """
@@ -93,7 +104,9 @@ if __name__ == '__main__':
 
     # initialise webdriver and performing translation
     driver = None
+    memory = None
     if content_to_translate:
+        memory = memory_from_config(config)
         options = Options()
         options.add_argument("-profile")
         options.add_argument(FIREFOX_PROFILE_PATH)
@@ -104,7 +117,7 @@ if __name__ == '__main__':
             driver = webdriver.Firefox(service =service,options = options)
             logger.info("driver initialized")
 
-            translator = CaiyunTranslator(driver,logger)
+            translator = CaiyunTranslator(driver,logger, memory=memory)
             result = translator.caiyun(content_to_translate)
 
             with open('result.txt',"w",encoding = "utf-8") as f:
@@ -118,6 +131,9 @@ if __name__ == '__main__':
             if driver:
                 logger.info("closing the browser")
                 driver.quit()
+            if memory is not None:
+                memory.report(logger)
+                memory.close()
             logger.info("script complete")
     else:
         logger.info("no content to translate, script complete")
\ No newline at end of file
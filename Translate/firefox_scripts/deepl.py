@@ -29,10 +29,11 @@ DEEPL_TARGET_LANGUAGES = {
 }
 
 class DeepLTranslator:
-    def __init__(self, browser, logger, to_lan="en-us", from_lan="auto"):
+    def __init__(self, browser, logger, to_lan="en-us", from_lan="auto", memory=None):
         self.browser = browser
         self.logger = logger
         self.content = ""
+        self.memory = memory
         self._initial_setup_done = False
 
         if to_lan.lower() not in DEEPL_TARGET_LANGUAGES:
@@ -66,6 +67,12 @@ class DeepLTranslator:
 
 
     def deepl(self, content):
+        '''Translates content, answering from the translation memory if one is given.'''
+        if self.memory is None:
+            return self._deepl(content)
+        return self.memory.translate_cached("deepl", self.from_lan, self.to_lan, content, self._deepl)
+
+    def _deepl(self, content):
         '''Translates a single block of content.'''
         try:
             self._initial_setup()
@@ -1,12 +1,21 @@
 import json
 import os
+import sys
 import logging
 import glob
+import queue
+import shutil
+import tempfile
+import threading
 from traceback import format_exc
 from selenium import webdriver
 from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.options import Options
 from deepl import DeepLTranslator
+from translation_memory import memory_from_config
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'OCR'))
+from ocr_store import refresh_stores_below
 
 def load_config():
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,16 +23,339 @@ def load_config():
     with open(config_path, 'r') as f:
         return json.load(f)
 
+def load_reused_translation(base_path, data, line_count):
+    """Returns the translated rec_texts of the page this page was reused from, if available.
+
+    The OCR stage marks near-identical pages with "reused_from" (relative to
+    the output folder). Only a translated source with the same number of
+    lines is used.
+    """
+    reused_from = data.get("reused_from")
+    if not reused_from:
+        return None
+    source_path = os.path.join(base_path, reused_from)
+    try:
+        with open(source_path, "r", encoding='utf-8') as f:
+            source = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not source.get("translated") or len(source.get("rec_texts", [])) != line_count:
+        return None
+    return source["rec_texts"]
+
+# Most characters one request may hold (config: translation_char_budget).
+# DeepL's web translator accepts 1500 characters per request without an account.
+DEEPL_CHAR_BUDGET = 1500
+SEPARATOR = "\n<br>\n"
+
+def write_translated(filepath, data, logger):
+    data["translated"] = True
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    logger.info(f"Result saved to {filepath}")
+
+class PageJob:
+    """The lines of one OCR result file that still need a translation.
+
+    The lines may be spread over several requests, possibly on different
+    sessions; the file is written once its last line is filled in, together
+    with the pages reused from it (`copies`, see hold_back_copies).
+    """
+
+    def __init__(self, filepath, data, translations):
+        self.filepath = filepath
+        self.data = data
+        self.texts = data["rec_texts"]
+        self.translations = translations  # None where the line is still missing
+        self.missing = [i for i, text in enumerate(translations) if text is None]
+        self.copies = []
+        self._remaining = len(self.missing)
+        self._lock = threading.Lock()
+
+    def fill(self, index, text):
+        """Sets the translation of one line, returns True when it was the last missing one."""
+        with self._lock:
+            self.translations[index] = text
+            self._remaining -= 1
+            return self._remaining == 0
+
+def prepare_page(filepath, base_path, logger, memory=None, from_lan='auto', to_lan='en-us'):
+    """Loads one OCR result file and resolves what needs no browser.
+
+    Returns "translated" (reused translation or everything in the
+    translation memory), "skipped", or a PageJob with the missing lines.
+    """
+    logger.info(f"--- Processing file: {filepath} ---")
+    try:
+        with open(filepath, "r", encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON in {filepath}. Skipping.")
+        return "skipped"
+
+    if data.get("translated"):
+        logger.info(f"File {filepath} is already translated. Skipping.")
+        return "skipped"
+
+    texts_to_translate = data.get("rec_texts")
+    if not texts_to_translate or not any(t.strip() for t in texts_to_translate):
+        logger.warning(f"File {filepath} has no text in 'rec_texts' or is empty. Skipping.")
+        return "skipped"
+
+    # Pages the OCR matched to an earlier page reuse its translation
+    source_texts = load_reused_translation(base_path, data, len(texts_to_translate))
+    if source_texts is not None:
+        data["rec_texts"] = source_texts
+        write_translated(filepath, data, logger)
+        logger.info(f"Reused the translation of {data['reused_from']} for {filepath}")
+        return "translated"
+
+    # Blank lines are kept as they are (DeepL may drop them, which would fail
+    # the whole packed request) and lines translated before are taken from
+    # the translation memory; only the others are sent to the browser
+    remembered = [text if not text.strip() else None for text in texts_to_translate]
+    if memory is not None:
+        pending = [i for i, text in enumerate(remembered) if text is None]
+        found = memory.lookup_many("deepl", from_lan, to_lan, [texts_to_translate[i] for i in pending])
+        for i, text in zip(pending, found):
+            remembered[i] = text
+    job = PageJob(filepath, data, remembered)
+    if not job.missing:
+        logger.info(f"All {len(texts_to_translate)} lines of {filepath} are blank or found in the translation memory.")
+        data["rec_texts"] = remembered
+        write_translated(filepath, data, logger)
+        return "translated"
+    return job
+
+def finish_page(job, logger):
+    """Writes a fully translated page and the copies held back for it, returns the number of files written."""
+    job.data["rec_texts"] = job.translations
+    write_translated(job.filepath, job.data, logger)
+    for copy in job.copies:
+        copy.data["rec_texts"] = list(job.translations)
+        write_translated(copy.filepath, copy.data, logger)
+        logger.info(f"Reused the translation of {job.filepath} for {copy.filepath}")
+    return 1 + len(job.copies)
+
+def hold_back_copies(jobs, base_path):
+    """Attaches pages reused from another page of the same run to that page's job.
+
+    Every file is prepared before any request is sent, so the source of a
+    "reused_from" page is not translated yet when the copy is prepared. Such
+    copies are taken out of `jobs` and written by finish_page once their
+    source is translated, so repeated pages are still translated only once.
+    Returns the remaining jobs.
+    """
+    by_path = {os.path.normpath(os.path.abspath(job.filepath)): job for job in jobs}
+    remaining = []
+    for job in jobs:
+        source = None
+        reused_from = job.data.get("reused_from")
+        if reused_from:
+            source = by_path.get(os.path.normpath(os.path.join(base_path, reused_from)))
+        if source is not None and source is not job and len(source.texts) == len(job.texts):
+            source.copies.append(job)
+        else:
+            remaining.append(job)
+    # A copy of a copy is written with the page its source is waiting for
+    reached = set()
+    for job in remaining:
+        pending, job.copies = job.copies, []
+        while pending:
+            copy = pending.pop()
+            job.copies.append(copy)
+            reached.add(copy)
+            pending.extend(copy.copies)
+            copy.copies = []
+    # Pages reused from each other in a cycle are translated on their own
+    for job in jobs:
+        if job not in remaining and job not in reached:
+            job.copies = []
+            remaining.append(job)
+    return remaining
+
+def pack_requests(jobs, char_budget):
+    """Packs the missing lines of consecutive pages into requests of at most char_budget characters.
+
+    Lines are never split; a line longer than the budget is sent on its
+    own. Returns a list of requests, each a list of (PageJob, line index).
+    """
+    requests, current, size = [], [], 0
+    for job in jobs:
+        for index in job.missing:
+            length = len(job.texts[index]) + (len(SEPARATOR) if current else 0)
+            if current and size + length > char_budget:
+                requests.append(current)
+                current, size = [], 0
+                length = len(job.texts[index])
+            current.append((job, index))
+            size += length
+    if current:
+        requests.append(current)
+    return requests
+
+def translate_request(request, translator, logger, memory=None):
+    """Translates one packed request and scatters the lines back to their pages.
+
+    Returns (status, finished files); status is "translated" or "failed",
+    a failure means the browser session may be broken.
+    """
+    try:
+        content_to_translate = SEPARATOR.join(job.texts[index] for job, index in request)
+        files = sorted({job.filepath for job, _ in request})
+        logger.info(f"Translating {len(request)} lines of {len(files)} file(s): {content_to_translate[:150]}...")
+        result = translator.deepl(content_to_translate)
+
+        if result.lower() in ["failed", "timed out"]:
+            logger.error(f"Translation failed for {', '.join(files)}. Skipping update.")
+            return "failed", 0
+
+        translated_texts = result.split(SEPARATOR)
+        if len(translated_texts) != len(request):
+            logger.error(f"Got {len(translated_texts)} lines back for {len(request)} sent, for {', '.join(files)}. Skipping update.")
+            return "failed", 0
+
+        if memory is not None:
+            memory.put_many("deepl", translator.from_lan, translator.to_lan,
+                            [(job.texts[index], text) for (job, index), text in zip(request, translated_texts)])
+        finished = 0
+        for (job, index), text in zip(request, translated_texts):
+            if job.fill(index, text):
+                finished += finish_page(job, logger)
+        return "translated", finished
+
+    except Exception as e:
+        logger.error(f"An error occurred while translating a request: {e}")
+        return "failed", 0
+    finally:
+        translator.clear_text_areas()
+
+class TranslationSession:
+    """One Firefox instance with its own translator, restarted after max_requests requests or a failure.
+
+    With copy_profile set, every start runs on a fresh copy of the Firefox
+    profile, so several sessions can run side by side (Firefox locks a
+    profile that is in use).
+    """
+
+    def __init__(self, config, logger, copy_profile, memory=None):
+        self.config = config
+        self.logger = logger
+        self.memory = memory
+        self.copy_profile = copy_profile
+        self.max_requests = int(config.get('translation_session_max_requests', 50))
+        self.driver = None
+        self.translator = None
+        self.profile_dir = None
+        self.requests_done = 0
+
+    def start(self):
+        profile_path = self.config.get('FIREFOX_PROFILE_PATH')
+        if self.copy_profile and profile_path:
+            self.profile_dir = tempfile.mkdtemp(prefix='translator-profile-')
+            shutil.copytree(profile_path, self.profile_dir, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns('lock', '.parentlock', 'parent.lock'))
+            profile_path = self.profile_dir
+
+        options = Options()
+        options.add_argument("-profile")
+        options.add_argument(profile_path)
+        service = Service(executable_path=self.config.get('GECKODRIVER_PATH'))
+
+        self.logger.info("Initializing Firefox driver for the session...")
+        self.driver = webdriver.Firefox(service=service, options=options)
+        self.logger.info("Driver initialized.")
+        # No memory for the engine itself: a packed request is only remembered
+        # line by line, after translate_request has checked the line count
+        self.translator = DeepLTranslator(self.driver, self.logger,
+                                          to_lan=self.config.get('to_lan', 'en-us'),
+                                          from_lan=self.config.get('from_lan', 'auto'))
+        self.requests_done = 0
+
+    def close(self):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def translate(self, request):
+        if self.driver is None:
+            self.start()
+        status, finished = translate_request(request, self.translator, self.logger, self.memory)
+        self.requests_done += 1
+        if status == "failed" or self.requests_done >= self.max_requests:
+            self.logger.info("Recycling the browser session.")
+            self.close()
+        return finished
+
+def translate_files(files_to_translate, config, base_path, logger, memory=None):
+    """Translates files on a pool of browser sessions, one worker thread per session.
+
+    The lines still missing after the translation memory are packed into
+    requests of up to translation_char_budget characters, across consecutive
+    pages, and the requests are spread over the sessions. At most
+    folder_subdirectories files are translated (0 means no limit).
+    Returns the number of translated files.
+    """
+    session_count = max(1, int(config.get('translation_sessions', 1)))
+    file_limit = int(config.get('folder_subdirectories') or 0)
+    char_budget = int(config.get('translation_char_budget') or DEEPL_CHAR_BUDGET)
+    from_lan = config.get('from_lan', 'auto').lower()
+    to_lan = config.get('to_lan', 'en-us').lower()
+
+    jobs = []
+    translated = [0]
+    for filepath in files_to_translate:
+        if file_limit > 0 and translated[0] + len(jobs) >= file_limit:
+            logger.info(f"Reached the limit of {file_limit} files.")
+            break
+        prepared = prepare_page(filepath, base_path, logger, memory, from_lan, to_lan)
+        if prepared == "translated":
+            translated[0] += 1
+        elif isinstance(prepared, PageJob):
+            jobs.append(prepared)
+
+    jobs = hold_back_copies(jobs, base_path)
+    requests = queue.Queue()
+    packed = pack_requests(jobs, char_budget)
+    for request in packed:
+        requests.put(request)
+    if packed:
+        logger.info(f"Sending {sum(len(job.missing) for job in jobs)} lines of {len(jobs)} files in {len(packed)} requests.")
+    lock = threading.Lock()
+
+    def worker():
+        session = TranslationSession(config, logger, copy_profile=session_count > 1, memory=memory)
+        try:
+            while True:
+                try:
+                    request = requests.get_nowait()
+                except queue.Empty:
+                    return
+                finished = session.translate(request)
+                with lock:
+                    translated[0] += finished
+        except Exception as e:
+            logger.error(f"A critical error occurred: {e}")
+            logger.error(format_exc())
+        finally:
+            session.close()
+
+    workers = [threading.Thread(target=worker, name=f"session-{i + 1}")
+               for i in range(min(session_count, len(packed)))]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return translated[0]
+
 if __name__ == '__main__':
     config = load_config()
-    GECKODRIVER_PATH = config.get('GECKODRIVER_PATH')
-    FIREFOX_PROFILE_PATH = config.get('FIREFOX_PROFILE_PATH')
-    to_lan = config.get('to_lan', 'en-us')
-    from_lan = config.get('from_lan', 'auto')
     active_translation_path = config.get('active_translation_path')
-    folder_subdirectories = int(config.get('folder_subdirectories', 0))
 
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
     logger = logging.getLogger(__name__)
 
     if not active_translation_path:
@@ -35,73 +367,20 @@ if __name__ == '__main__':
     files_to_translate = []
     for root, _, files in os.walk(search_path):
         for file in files:
-            if file.endswith('.json'):
+            # *_det.json files only hold the OCR text boxes
+            if file.endswith('.json') and not file.endswith('_det.json'):
                 files_to_translate.append(os.path.join(root, file))
     files_to_translate.sort()
 
     if not files_to_translate:
         logger.warning(f"No '.json' files found in {search_path}.")
     else:
-        driver = None
-        options = Options()
-        options.add_argument("-profile")
-        options.add_argument(FIREFOX_PROFILE_PATH)
-        service = Service(executable_path=GECKODRIVER_PATH)
-
-        try:
-            logger.info("Initializing Firefox driver for the session...")
-            driver = webdriver.Firefox(service=service, options=options)
-            logger.info("Driver initialized.")
-
-            translator = DeepLTranslator(driver, logger, to_lan=to_lan, from_lan=from_lan)
-            translated_files_count = 0
-
-            for filepath in files_to_translate:
-                if folder_subdirectories > 0 and translated_files_count >= folder_subdirectories:
-                    logger.info(f"Processed {translated_files_count} files, reaching the limit of {folder_subdirectories}.")
-                    break
-
-                logger.info(f"--- Processing file: {filepath} ---")
-                try:
-                    with open(filepath, "r", encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    texts_to_translate = data.get("rec_texts")
-                    if not texts_to_translate or not any(t.strip() for t in texts_to_translate):
-                        logger.warning(f"File {filepath} has no text in 'rec_texts' or is empty. Skipping.")
-                        continue
-
-                    separator = "\n<br>\n"
-                    content_to_translate = separator.join(texts_to_translate)
-                    
-                    logger.info(f"Content to translate: {content_to_translate[:150]}...")
-                    result = translator.deepl(content_to_translate)
-
-                    if result.lower() in ["failed", "timed out"]:
-                        logger.error(f"Translation failed for {filepath}. Skipping update.")
-                        continue
-
-                    translated_texts = result.split(separator)
-                    data["rec_texts"] = translated_texts
-
-                    with open(filepath, "w", encoding="utf-8") as f:
-                        json.dump(data, f, ensure_ascii=False, indent=4)
-                    logger.info(f"Result saved to {filepath}")
-                    translated_files_count += 1
-
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in {filepath}. Skipping.")
-                except Exception as e:
-                    logger.error(f"An error occurred while processing {filepath}: {e}")
-                finally:
-                    if driver:
-                        translator.clear_text_areas()
-
-        except Exception as e:
-            logger.error(f"A critical error occurred: {e}")
-            logger.error(format_exc())
-        finally:
-            if driver:
-                logger.info("All files processed. Closing the browser.")
-                driver.quit()
-            logger.info("Script complete.")
\ No newline at end of file
+        memory = memory_from_config(config)
+        translate_files(files_to_translate, config, base_path, logger, memory)
+        # The page JSON files now hold the translations, rebuild their compact stores
+        for store_path in refresh_stores_below(search_path):
+            logger.info(f"Updated compact OCR store {store_path}")
+        if memory is not None:
+            memory.report(logger)
+            memory.close()
+        logger.info("Script complete.")
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+import unicodedata
+
+DEFAULT_MEMORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cache', 'translation_memory.sqlite3')
+
+# SQLite allows at most 999 parameters per statement in older builds
+_LOOKUP_CHUNK = 900
+
+def normalize_text(text):
+    """Normalizes a source text for lookups: NFKC (full-width forms), collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def memory_from_config(config):
+    """Opens the translation memory configured in config.json, or returns None if it is disabled."""
+    if not config.get('translation_memory_enabled', True):
+        return None
+    # Relative paths are relative to the project root
+    project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+    return TranslationMemory(os.path.join(project_root, config.get('translation_memory_path', DEFAULT_MEMORY_PATH)))
+
+class TranslationMemory:
+    """Local store of earlier translations, shared by all translation engines.
+
+    Entries are keyed on engine, source language, target language and the
+    normalized source text, so recurring names, SFX and stock phrases are
+    only ever sent to a web engine once. The store is a single SQLite file
+    and can be shared by the threads of a session pool.
+    """
+
+    def __init__(self, db_path=DEFAULT_MEMORY_PATH):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            " engine TEXT NOT NULL, from_lan TEXT NOT NULL, to_lan TEXT NOT NULL,"
+            " source TEXT NOT NULL, translation TEXT NOT NULL,"
+            " PRIMARY KEY (engine, from_lan, to_lan, source))"
+        )
+        self._connection.commit()
+        self.lookups = 0
+        self.hits = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get(self, engine, from_lan, to_lan, text):
+        """Returns the remembered translation of one text, or None."""
+        return self.lookup_many(engine, from_lan, to_lan, [text])[0]
+
+    def lookup_many(self, engine, from_lan, to_lan, texts):
+        """Looks up a list of texts (e.g. a page's rec_texts) at once.
+
+        Returns a list of the same length with the translation of every text,
+        or None where there is none.
+        """
+        sources = [normalize_text(text) for text in texts]
+        unique = list(dict.fromkeys(source for source in sources if source))
+        found = {}
+        with self._lock:
+            for start in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[start:start + _LOOKUP_CHUNK]
+                rows = self._connection.execute(
+                    "SELECT source, translation FROM memory WHERE engine = ? AND from_lan = ? AND to_lan = ?"
+                    f" AND source IN ({','.join('?' * len(chunk))})",
+                    (engine, from_lan, to_lan, *chunk),
+                )
+                found.update(rows)
+            results = [found.get(source) for source in sources]
+            self.lookups += len(texts)
+            self.hits += sum(result is not None for result in results)
+        return results
+
+    def put(self, engine, from_lan, to_lan, text, translation):
+        """Remembers the translation of one text."""
+        self.put_many(engine, from_lan, to_lan, [(text, translation)])
+
+    def put_many(self, engine, from_lan, to_lan, pairs):
+        """Remembers a list of (text, translation) pairs."""
+        rows = [(engine, from_lan, to_lan, normalize_text(text), translation)
+                for text, translation in pairs if normalize_text(text) and translation.strip()]
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?)", rows)
+            self._connection.commit()
+
+    def translate_cached(self, engine, from_lan, to_lan, content, translate):
+        """Returns the remembered translation of `content`, or calls `translate(content)` and remembers it.
+
+        Used by the engines for standalone calls. Failed translations are
+        never remembered; callers that translate packed requests (see
+        translating_engine) check the result themselves and use put_many.
+        """
+        remembered = self.get(engine, from_lan, to_lan, content)
+        if remembered is not None:
+            return remembered
+        translation = translate(content)
+        if translation != "failed":
+            self.put(engine, from_lan, to_lan, content, translation)
+        return translation
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def report(self, logger):
+        logger.info(f"Translation memory: {self.hits}/{self.lookups} texts found ({self.hit_rate():.0%} hit rate).")
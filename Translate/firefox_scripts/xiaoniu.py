@@ -1,4 +1,6 @@
 import time 
+import os
+import json
 import random 
 import logging 
 from traceback import format_exc
@@ -10,14 +12,25 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from translation_memory import memory_from_config
+
 class XiaoniuTranslator:
-    def __init__(self, browser, logger):
+    def __init__(self, browser, logger, memory=None):
         self.browser = browser
         self.logger = logger 
-        self.content = ""   # store the translations for future database implementation
+        self.content = ""
+        self.memory = memory
+        self.from_lan = "auto"
+        self.to_lan = "default"  # the site's own language pair
         self.url = "https://niutrans.com/trans?type=text"
 
-    def xiaoniu(self,content):
+    def xiaoniu(self, content):
+        '''Translates content, answering from the translation memory if one is given.'''
+        if self.memory is None:
+            return self._xiaoniu(content)
+        return self.memory.translate_cached("xiaoniu", self.from_lan, self.to_lan, content, self._xiaoniu)
+
+    def _xiaoniu(self,content):
         '''
         This is designed to be a seperate file in the future, so when the webscraper fails , only this function needs to be changed  
         '''
@@ -68,10 +81,18 @@ class XiaoniuTranslator:
             self.logger.error(format_exc())
             return "failed"
         
+def load_config():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(script_dir, '..', '..', 'config.json')
+    
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    return config
+
 if __name__ == '__main__':
-    # broswer config
-    GECKODRIVER_PATH = ''
-    FIREFOX_PROFILE_PATH = ''
+    config = load_config()
+    GECKODRIVER_PATH = config.get('GECKODRIVER_PATH')
+    FIREFOX_PROFILE_PATH = config.get('FIREFOX_PROFILE_PATH')
 
     #setup basic logger for testing 
     logging.basicConfig(level = logging.INFO,format= '%(asctime)s - %(levelname)s - %(message)s')
@@ -88,7 +109,9 @@ if __name__ == '__main__':
 
     # initialise webdriver and performing translation
     driver = None
+    memory = None
     if content_to_translate:
+        memory = memory_from_config(config)
         options = Options()
         options.set_preference("dom.webdriver.enabled", False)
         options.set_preference('useAutomationExtension', False)
@@ -102,7 +125,7 @@ if __name__ == '__main__':
             driver = webdriver.Firefox(service = service,options = options)
             logger.info("driver initialized")
 
-            translator = XiaoniuTranslator(driver,logger)
+            translator = XiaoniuTranslator(driver,logger, memory=memory)
             result = translator.xiaoniu(content_to_translate)
 
             with open('result.txt,"w",encoding = "utf-8') as f:
@@ -116,6 +139,9 @@ if __name__ == '__main__':
             if driver:
                 logger.info("closing the browser")
                 driver.quit()
+            if memory is not None:
+                memory.report(logger)
+                memory.close()
             logger.info("script complete")
     else:
         logger.info("no content to translate, script complete")
\ No newline at end of file
@@ -1,214 +1,658 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import multiprocessing
+from pathlib import Path
+from functools import lru_cache
+
 import cv2
 import numpy as np
-from shapely.geometry import Polygon, Point
+from shapely.geometry import Polygon, box
 from PIL import Image, ImageDraw, ImageFont
 from shapely.ops import unary_union
+from shapely.affinity import translate
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR / "OCR"))
+from ocr_store import STORE_FILENAME, load_fresh_store, find_page_results as find_store_pages  # noqa: E402
+
+CONFIG_PATH = SCRIPT_DIR / "config.json"
+INPUT_DIR = SCRIPT_DIR / "input"
+OUTPUT_DIR = SCRIPT_DIR / "output"
+
+# How the text under a bubble is painted over: "median" (median color of the
+# bubble's border, fast) or "telea" (cv2.inpaint, for text over artwork)
+INPAINT_METHOD = "median"
+INPAINT_PADDING = 3
+
+# Rendered regions are kept in RENDER_CACHE_DIR, so a re-render only redraws
+# the regions whose polygon, text, font settings or page pixels changed, and
+# skips pages where nothing changed at all. Tiles beyond RENDER_CACHE_MAX_MB
+# are removed, least recently used first
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_DIR = SCRIPT_DIR / "cache" / "render"
+RENDER_CACHE_VERSION = 1
+RENDER_CACHE_MAX_MB = 256
+# Pages that wrote tiles between two rescans of the cache directory, so tiles
+# of other render workers are counted even while this one stays below the cap
+RENDER_CACHE_RESCAN_INTERVAL = 64
+# Running size of the render cache in this process (None until first scanned)
+RENDER_CACHE_STATS = {"bytes": None, "writes": 0}
 
 FONT_SIZE = 12
+# Fit the largest font size (between MIN_FONT_SIZE and MAX_FONT_SIZE) at which
+# the whole text fits in its polygon, instead of always using FONT_SIZE
+AUTO_FONT_SIZE = True
+MIN_FONT_SIZE = 8
+MAX_FONT_SIZE = 40
 FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-INPAINT_RGB = (200, 200, 255)  # Matches OpenCV's (255, 200, 200) in RGB
+
+
+def line_bounds(polygons):
+    """Returns the (n, 4) array of x_min, y_min, x_max, y_max of every text line polygon."""
+    if not polygons:
+        return np.zeros((0, 4), dtype=np.int64)
+    try:
+        points = np.asarray(polygons, dtype=np.int64)  # all quads, the usual OCR output
+        return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+    except ValueError:
+        return np.array([[*np.min(poly, axis=0), *np.max(poly, axis=0)] for poly in polygons], dtype=np.int64)
+
+
+def find_neighbor_lines(bounds, gap_threshold):
+    """Returns (i, j) index pairs of lines that sit next to each other within gap_threshold.
+
+    Lines are neighbors when they are side by side (overlapping in y,
+    like the columns of vertical Japanese text) or stacked (overlapping in x)
+    with at most gap_threshold pixels between them. Candidates come from a
+    sweep over the lines sorted by x_min, so only lines whose x ranges come
+    within the threshold are ever compared.
+    """
+    order = np.argsort(bounds[:, 0], kind="stable")
+    x_min = bounds[order, 0]
+    reach = np.searchsorted(x_min, bounds[order, 2] + gap_threshold, side="right")
+
+    pairs = []
+    for position, (i, end) in enumerate(zip(order, reach)):
+        others = order[position + 1:end]
+        if not len(others):
+            continue
+        x0, y0, x1, y1 = bounds[i]
+        candidates = bounds[others]
+        hgap = np.maximum(candidates[:, 0], x0) - np.minimum(candidates[:, 2], x1)
+        vgap = np.maximum(candidates[:, 1], y0) - np.minimum(candidates[:, 3], y1)
+        close = ((hgap <= gap_threshold) & (vgap < 0)) | ((vgap <= gap_threshold) & (hgap < 0))
+        pairs.extend((int(i), int(j)) for j in others[close])
+    return pairs
+
+
+def bridge_patch(a, b):
+    """Returns the box that closes the gap between two neighboring line bounds, or None if they touch."""
+    if a[2] < b[0] or b[2] < a[0]:
+        # Side by side: a patch as high as the shorter line, centered on the shared rows
+        left, right = (a, b) if a[2] < b[0] else (b, a)
+        patch_height = min(a[3] - a[1], b[3] - b[1])
+        mid_y = (max(a[1], b[1]) + min(a[3], b[3])) // 2
+        y1 = max(mid_y - patch_height // 2, 0)
+        y2 = max(mid_y + patch_height // 2, y1 + 1)
+        return box(left[2], y1, right[0], y2)
+    if a[3] < b[1] or b[3] < a[1]:
+        # Stacked: a patch as wide as the narrower line, centered on the shared columns
+        top, bottom = (a, b) if a[3] < b[1] else (b, a)
+        patch_width = min(a[2] - a[0], b[2] - b[0])
+        mid_x = (max(a[0], b[0]) + min(a[2], b[2])) // 2
+        x1 = max(mid_x - patch_width // 2, 0)
+        x2 = max(mid_x + patch_width // 2, x1 + 1)
+        return box(x1, top[3], x2, bottom[1])
+    return None
+
+
+def group_vertical_japanese_lines(polygons, gap_threshold=15):
+    """Groups text line polygons into merged regions, e.g. the columns of one speech bubble.
+
+    Returns (merged polygon, member line indices) pairs, ordered by their
+    first member. Every group is unioned on its own from the line boxes
+    (padded by 2 px) and the patches bridging neighboring lines.
+    """
+    bounds = line_bounds(polygons)
+    parent = list(range(len(bounds)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    pairs = find_neighbor_lines(bounds, gap_threshold)
+    for i, j in pairs:
+        parent[find(i)] = find(j)
+
+    members = {}
+    for i in range(len(bounds)):
+        members.setdefault(find(i), []).append(i)
+    patches = {}
+    for i, j in pairs:
+        patch = bridge_patch(bounds[i], bounds[j])
+        if patch is not None:
+            patches.setdefault(find(i), []).append(patch)
+
+    groups = []
+    for root, indices in members.items():
+        shapes = [box(*(bounds[i] + (-2, -2, 2, 2))) for i in indices] + patches.get(root, [])
+        unified = unary_union(shapes) if len(shapes) > 1 else shapes[0]
+        for polygon in ([unified] if unified.geom_type == "Polygon" else unified.geoms):
+            groups.append((polygon, indices))
+    return groups
 
 
 def merge_vertical_japanese_lines(polygons, gap_threshold=15):
-    def get_bounds(poly):
-        xs = [p[0] for p in poly]
-        ys = [p[1] for p in poly]
-        return min(xs), max(xs), min(ys), max(ys)
-
-    sorted_polys = sorted(polygons, key=lambda p: sum(pt[0] for pt in p) / len(p))
-    merged_polys = []
-
-    for i in range(len(sorted_polys)):
-        curr = sorted_polys[i]
-        cx_min, cx_max, cy_min, cy_max = get_bounds(curr)
-        merged_polys.append(Polygon([
-            (cx_min - 2, cy_min - 2),
-            (cx_max + 2, cy_min - 2),
-            (cx_max + 2, cy_max + 2),
-            (cx_min - 2, cy_max + 2)
-        ]))
-
-        if i < len(sorted_polys) - 1:
-            nxt = sorted_polys[i + 1]
-            nx_min, nx_max, ny_min, ny_max = get_bounds(nxt)
-            hgap = nx_min - cx_max
-            if hgap > gap_threshold:
-                continue
-
-            height1 = cy_max - cy_min
-            height2 = ny_max - ny_min
-            patch_height = min(height1, height2)
-
-            shared_y_top = max(cy_min, ny_min)
-            shared_y_bottom = min(cy_max, ny_max)
-            mid_y = (shared_y_top + shared_y_bottom) // 2
-
-            y1 = mid_y - patch_height // 2
-            y2 = mid_y + patch_height // 2
-            y1 = max(y1, 0)
-            y2 = max(y2, y1 + 1)
-
-            gap_box = Polygon([
-                (cx_max, y1),
-                (nx_min, y1),
-                (nx_min, y2),
-                (cx_max, y2)
-            ])
-            merged_polys.append(gap_box)
-
-    unified = unary_union(merged_polys)
-    if unified.geom_type == "Polygon":
-        return [unified]
-    else:
-        return list(unified.geoms)
+    return [polygon for polygon, _ in group_vertical_japanese_lines(polygons, gap_threshold)]
 
 
-def draw_text_inside_polygon(img_pil, polygon: Polygon, text: str, font_path: str):
-    draw = ImageDraw.Draw(img_pil)
-    font = ImageFont.truetype(font_path, FONT_SIZE)
+def polygon_interior_mask(polygon: Polygon):
+    """Rasterizes the interior of a polygon into a boolean mask over its integer bounds.
 
+    Returns (mask, minx, miny); mask[y - miny, x - minx] is True exactly when
+    polygon.contains(Point(x, y)) is, for x in [minx, maxx + 1] and y in
+    [miny, maxy]. Points on the boundary are outside, like in shapely, which
+    is why this uses an even-odd crossing test per edge instead of
+    cv2.fillPoly (that one also fills the boundary pixels).
+    """
     minx, miny, maxx, maxy = map(int, polygon.bounds)
-    line_height = FONT_SIZE + 4
+    width, height = maxx - minx + 2, maxy - miny + 1
+    ys = np.arange(miny, maxy + 1, dtype=np.float64)[:, None]
+    # toggles[r, i] counts the edges crossing row r at some x with ceil(x) == minx + i,
+    # a pixel is inside when an odd number of edges cross its row to its right
+    toggles = np.zeros((height, width + 1), dtype=np.int32)
+    boundary = np.zeros((height, width), dtype=bool)
+
+    for ring in [polygon.exterior, *polygon.interiors]:
+        coords = np.asarray(ring.coords, dtype=np.float64)
+        x1, y1 = coords[:-1, 0], coords[:-1, 1]
+        x2, y2 = coords[1:, 0], coords[1:, 1]
+
+        flat = y1 == y2
+        for row, left, right in zip(y1[flat], np.minimum(x1, x2)[flat], np.maximum(x1, x2)[flat]):
+            left, right = int(np.ceil(left)) - minx, int(np.floor(right)) - minx
+            boundary[int(row) - miny, max(left, 0):right + 1] = True
+
+        x1, y1, x2, y2 = x1[~flat], y1[~flat], x2[~flat], y2[~flat]
+        x_at = x1 + (ys - y1) * (x2 - x1) / (y2 - y1)  # rows x edges
+        crossing = (y1 > ys) != (y2 > ys)
+        rows, edges = np.nonzero(crossing)
+        columns = np.clip(np.ceil(x_at[rows, edges]).astype(np.int64) - minx, 0, width)
+        np.add.at(toggles, (rows, columns), 1)
+
+        # Pixels lying exactly on a sloped or vertical edge
+        touching = (ys >= np.minimum(y1, y2)) & (ys <= np.maximum(y1, y2)) & (x_at == np.round(x_at))
+        rows, edges = np.nonzero(touching)
+        columns = x_at[rows, edges].astype(np.int64) - minx
+        boundary[rows, columns] = True
+
+    inside = np.cumsum(toggles[:, :0:-1], axis=1)[:, ::-1] % 2 == 1
+    return inside & ~boundary, minx, miny
+
+
+def row_segments(mask, minx, miny, y):
+    """Returns the (start_x, end_x) runs of a mask row that are inside the polygon, end exclusive."""
+    row_index = y - miny
+    if not 0 <= row_index < mask.shape[0]:
+        return []
+    # The last column (maxx + 1) is never scanned, a run reaching maxx ends there
+    row = mask[row_index, :-1].astype(np.int8)
+    edges = np.diff(np.concatenate(([0], row, [0])))
+    starts = np.flatnonzero(edges == 1) + minx
+    ends = np.flatnonzero(edges == -1) + minx
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class GlyphMetrics:
+    """A loaded font with a table of glyph advances, filled as characters are first seen."""
+
+    def __init__(self, font_path, size):
+        self.font = ImageFont.truetype(font_path, size)
+        self.size = size
+        self._advances = {}
+
+    def advance(self, char):
+        width = self._advances.get(char)
+        if width is None:
+            width = self._advances[char] = self.font.getlength(char)
+        return width
+
+
+@lru_cache(maxsize=None)
+def glyph_metrics(font_path, size):
+    """Returns the shared GlyphMetrics of a font path and size."""
+    return GlyphMetrics(font_path, size)
+
+
+def layout_text_in_mask(mask, mask_x, mask_y, bounds, text, metrics):
+    """Lays text out on the rows of a polygon mask without drawing anything.
+
+    Text flows left to right through the inside segments of every row;
+    a word cut at the end of a row gets a hyphen and continues on the next
+    row. Returns (runs, fits): runs are (x, y, string) pieces that can each
+    be drawn with one draw.text call, fits is False if text was left over.
+    """
+    minx, miny, maxx, maxy = bounds
+    line_height = metrics.size + 4
     y_cursor = miny
     text_cursor = 0
-
-    current_word = ""
-    current_word_positions = []
-    in_word = False
-    next_line_hyphen = False
-    erased_char = None
-    erased_char_fontbox = None
+    runs = []
+    carried = ""  # "-" plus the last character of a word cut at the previous row
 
     while y_cursor + line_height <= maxy and text_cursor < len(text):
-        x = minx
-        segments = []
-        inside = False
-        seg_start = None
-
-        while x <= maxx:
-            point = Point(x, y_cursor + FONT_SIZE // 2)
-            if polygon.contains(point):
-                if not inside:
-                    seg_start = x
-                    inside = True
-            else:
-                if inside:
-                    segments.append((seg_start, x))
-                    inside = False
-            x += 1
-        if inside:
-            segments.append((seg_start, x))
-
-        for start_x, end_x in segments:
+        center_y = y_cursor + metrics.size // 2
+        row_start = len(runs)
+        last_char = None
+
+        for start_x, end_x in row_segments(mask, mask_x, mask_y, center_y):
             curr_x = start_x
+            run_x, run = curr_x, carried
+            for char in carried:
+                curr_x += metrics.advance(char)
+            carried = ""
+
             while text_cursor < len(text):
                 char = text[text_cursor]
-
                 if char == "\n":
                     text_cursor += 1
                     break
 
-                # If line just broke mid-word, add hyphen at start
-                if next_line_hyphen:
-                    bbox = draw.textbbox((0, 0), "-", font=font)
-                    dash_width = bbox[2] - bbox[0]
-                    draw.text((curr_x, y_cursor), "-", font=font, fill=(0, 0, 0))
-                    curr_x += dash_width
-
-                    # Redraw the erased character
-                    if erased_char and erased_char_fontbox:
-                        char_width = erased_char_fontbox[2] - erased_char_fontbox[0]
-                        draw.text((curr_x, y_cursor), erased_char, font=font, fill=(0, 0, 0))
-                        curr_x += char_width
-                        # reset
-                        erased_char = None
-                        erased_char_fontbox = None
-
-                    next_line_hyphen = False
-
-                bbox = draw.textbbox((0, 0), char, font=font)
-                char_width = bbox[2] - bbox[0]
-
+                char_width = metrics.advance(char)
                 if curr_x + char_width > end_x:
                     break  # move to next segment
 
-                center_point = Point(curr_x + char_width // 2, y_cursor + FONT_SIZE // 2)
-                if polygon.contains(center_point):
-                    draw.text((curr_x, y_cursor), char, font=font, fill=(0, 0, 0))
-
-                    if char != " ":
-                        if not in_word:
-                            in_word = True
-                            current_word = ""
-                            current_word_positions = []
-                        current_word += char
-                        current_word_positions.append((curr_x, y_cursor, char_width))
-                    else:
-                        in_word = False
-                        current_word = ""
-                        current_word_positions = []
-
+                if mask[center_y - mask_y, int(curr_x + char_width / 2) - mask_x]:
+                    run += char
+                    last_char = char
                     curr_x += char_width
                     text_cursor += 1
                 else:
-                    curr_x += 1  # shift right to find a better spot
+                    # shift right to find a better spot
+                    if run:
+                        runs.append((run_x, y_cursor, run))
+                    curr_x += 1
+                    run_x, run = curr_x, ""
+
+            if run:
+                runs.append((run_x, y_cursor, run))
+
+        # End of the line: if a word continues on the next one, hyphenate
+        cut_word = (last_char not in (None, " ") and text_cursor < len(text)
+                    and text[text_cursor] not in " \n")
+        if cut_word and len(runs) > row_start:
+            x, y, run = runs[-1]
+            if run[-2:-1] in ("", " "):
+                # A single letter is moved to the next row as a whole
+                runs[-1] = (x, y, run[:-1])
+                carried = run[-1]
+            else:
+                runs[-1] = (x, y, run[:-1] + "-")
+                carried = "-" + run[-1]
 
-        # End of the line: if we were mid-word, hyphenate
-        if in_word:
-            in_word = False
-            if current_word and len(current_word_positions) >= 1:
-                last_x, last_y, last_w = current_word_positions[-1]
-                erased_char = current_word[-1]
-                erased_char_fontbox = draw.textbbox((0, 0), erased_char, font=font)
+        y_cursor += line_height
 
-                draw.rectangle([last_x, last_y, last_x + last_w, last_y + FONT_SIZE + 1], fill=INPAINT_RGB)
-                draw.text((last_x, last_y), "-", font=font, fill=(0, 0, 0))
+    return runs, text_cursor >= len(text) and not carried
 
-                next_line_hyphen = True
-                current_word = ""
-                current_word_positions = []
 
-        y_cursor += line_height
+def fit_font_size(mask, mask_x, mask_y, bounds, text, font_path, min_size=MIN_FONT_SIZE, max_size=MAX_FONT_SIZE):
+    """Binary-searches the largest font size at which text fits in a polygon mask.
+
+    Every probe is a layout-only pass, nothing is drawn. Returns min_size
+    if the text does not fit even at that size.
+    """
+    best = min_size
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        _, fits = layout_text_in_mask(mask, mask_x, mask_y, bounds, text, glyph_metrics(font_path, size))
+        if fits:
+            best, low = size, size + 1
+        else:
+            high = size - 1
+    return best
+
+
+def draw_text_inside_polygon(img_pil, polygon: Polygon, text: str, font_path: str, font_size=None):
+    draw = ImageDraw.Draw(img_pil)
+
+    bounds = tuple(map(int, polygon.bounds))
+    # Rasterized once, every row and character center of the layout is a lookup into it
+    mask, mask_x, mask_y = polygon_interior_mask(polygon)
+    if font_size is None:
+        font_size = fit_font_size(mask, mask_x, mask_y, bounds, text, font_path) if AUTO_FONT_SIZE else FONT_SIZE
+    metrics = glyph_metrics(font_path, font_size)
+    runs, _ = layout_text_in_mask(mask, mask_x, mask_y, bounds, text, metrics)
+
+    for x, y, run in runs:
+        draw.text((x, y), run, font=metrics.font, fill=(0, 0, 0))
 
     return img_pil
 
 
-def inpaint_and_draw_text(image_path, polygons, output_path, text):
-    img = cv2.imread(image_path)
-    if img is None:
-        print("Image load failed:", image_path)
-        return
+def reading_order(bounds, indices):
+    """Sorts the lines of one region: vertical columns right to left, horizontal lines top to bottom."""
+    lines = bounds[indices]
+    if np.sum(lines[:, 3] - lines[:, 1]) >= np.sum(lines[:, 2] - lines[:, 0]):
+        return [indices[i] for i in np.lexsort((lines[:, 1], -lines[:, 2]))]
+    return [indices[i] for i in np.lexsort((lines[:, 0], lines[:, 1]))]
 
-    height, width = img.shape[:2]
-    mask = np.zeros((height, width), dtype=np.uint8)
 
-    merged_polygons = merge_vertical_japanese_lines(polygons)
+def region_texts(polygons, texts):
+    """Merges the text lines of a page into regions and joins each region's texts in reading order.
 
-    for poly in merged_polygons:
-        pts = np.array([list(poly.exterior.coords)], dtype=np.int32)
-        cv2.fillPoly(img, pts, (255, 200, 200))  # light red
+    Returns (merged polygon, text) pairs; texts[i] belongs to polygons[i].
+    """
+    bounds = line_bounds(polygons)
+    regions = []
+    for polygon, indices in group_vertical_japanese_lines(polygons):
+        text = " ".join(texts[i].strip() for i in reading_order(bounds, indices) if texts[i].strip())
+        if text:
+            regions.append((polygon, text))
+    return regions
 
-    img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
 
-    for poly in merged_polygons:
-        img_pil = draw_text_inside_polygon(img_pil, poly, text, FONT_PATH)
+def region_crop_box(image_shape, polygon, padding=INPAINT_PADDING):
+    """Returns the (x0, y0, x1, y1) box around a region, padded for the background border and clipped to the page."""
+    height, width = image_shape[:2]
+    minx, miny, maxx, maxy = polygon.bounds
+    x0, y0 = max(int(np.floor(minx)) - padding, 0), max(int(np.floor(miny)) - padding, 0)
+    x1, y1 = min(int(np.ceil(maxx)) + padding + 1, width), min(int(np.ceil(maxy)) + padding + 1, height)
+    return x0, y0, x1, y1
 
-    final = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-    cv2.imwrite(output_path, final)
-    cv2.imshow("Text Inside Polygon", final)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+
+def fill_background(crop, mask):
+    """Paints over the masked pixels of a BGR crop in place with the estimated background.
+
+    "median" fills them with the median color of the pixels bordering the
+    mask, which suits the flat white of most speech bubbles; "telea" runs
+    cv2.inpaint for textured backgrounds.
+    """
+    if INPAINT_METHOD == "telea":
+        crop[:] = cv2.inpaint(crop, mask, 3, cv2.INPAINT_TELEA)
+        return
+    border = cv2.dilate(mask, np.ones((5, 5), dtype=np.uint8)) & ~mask
+    border_pixels = crop[border > 0]
+    color = np.median(border_pixels, axis=0) if len(border_pixels) else 255
+    crop[mask > 0] = color
+
+
+def render_region(img, polygon, text, font_path=FONT_PATH):
+    """Inpaints one merged region of a BGR page in place and draws its text into it.
+
+    Only the region's crop is touched: the background is filled in the crop,
+    the text is drawn into an RGBA tile of the crop's size and the tile is
+    alpha-composited back into the page buffer. Returns the crop box and the
+    mask of the pixels that were changed.
+    """
+    x0, y0, x1, y1 = region_crop_box(img.shape, polygon)
+    crop = img[y0:y1, x0:x1]  # a view, written in place
+    local_polygon = translate(polygon, -x0, -y0)
+
+    mask = np.zeros(crop.shape[:2], dtype=np.uint8)
+    cv2.fillPoly(mask, [np.array(local_polygon.exterior.coords, dtype=np.int32)], 255)
+    fill_background(crop, mask)
+
+    tile = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
+    draw_text_inside_polygon(tile, local_polygon, text, font_path)
+    tile = np.asarray(tile)
+    drawn = tile[..., 3] > 0
+    alpha = tile[drawn, 3:].astype(np.float32) / 255
+    crop[drawn] = np.round(crop[drawn] * (1 - alpha) + tile[drawn, 2::-1] * alpha).astype(np.uint8)
+
+    return (x0, y0, x1, y1), (mask > 0) | drawn
+
+
+def region_spec(polygon, text, font_path=FONT_PATH):
+    """Returns the digest of everything a rendered region depends on, except the page pixels."""
+    spec = [RENDER_CACHE_VERSION, list(polygon.exterior.coords), text, font_path,
+            AUTO_FONT_SIZE, MIN_FONT_SIZE, MAX_FONT_SIZE, FONT_SIZE, INPAINT_METHOD, INPAINT_PADDING]
+    return hashlib.blake2b(json.dumps(spec).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def render_region_cached(img, polygon, text, spec, font_path=FONT_PATH):
+    """render_region, reusing the rendered tile of an identical region from the render cache.
+
+    Tiles are keyed on the region spec and the page pixels under the region,
+    and stored as BGRA PNGs whose alpha channel marks the changed pixels.
+    Returns the size in bytes of the tile written to the cache, 0 on a hit.
+    """
+    if not RENDER_CACHE_ENABLED:
+        render_region(img, polygon, text, font_path)
+        return 0
+
+    x0, y0, x1, y1 = region_crop_box(img.shape, polygon)
+    crop = img[y0:y1, x0:x1]
+    digest = hashlib.blake2b(spec.encode("utf-8"), digest_size=20)
+    digest.update(np.ascontiguousarray(crop).data)
+    tile_path = RENDER_CACHE_DIR / f"{digest.hexdigest()}.png"
+
+    tile = cv2.imread(str(tile_path), cv2.IMREAD_UNCHANGED) if tile_path.exists() else None
+    if tile is not None and tile.shape[:2] == crop.shape[:2]:
+        changed = tile[..., 3] > 0
+        crop[changed] = tile[changed, :3]
+        try:
+            os.utime(tile_path)
+        except FileNotFoundError:
+            pass  # evicted by another worker meanwhile
+        return 0
+
+    _, changed = render_region(img, polygon, text, font_path)
+    tile = np.dstack([crop, changed.astype(np.uint8) * 255])
+    # Written under a temporary name first, render workers may share the cache
+    RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = tile_path.with_name(f"{tile_path.stem}.{os.getpid()}.tmp.png")
+    cv2.imwrite(str(tmp_path), tile)
+    size = tmp_path.stat().st_size
+    os.replace(tmp_path, tile_path)
+    return size
+
+
+def track_render_cache(written_bytes):
+    """Adds newly written tiles to the running size of the render cache.
+
+    The directory is only rescanned (see evict_render_cache) when the running
+    size passes RENDER_CACHE_MAX_MB, and every RENDER_CACHE_RESCAN_INTERVAL
+    calls to pick up the tiles written by other render workers.
+    """
+    stats = RENDER_CACHE_STATS
+    if stats["bytes"] is not None:
+        stats["bytes"] += written_bytes
+    stats["writes"] += 1
+    if (stats["bytes"] is None or stats["bytes"] > RENDER_CACHE_MAX_MB * 1024 * 1024
+            or stats["writes"] >= RENDER_CACHE_RESCAN_INTERVAL):
+        evict_render_cache()
+
+
+def evict_render_cache(max_bytes=None):
+    """Rescans the render cache and removes the least recently used tiles if it exceeds RENDER_CACHE_MAX_MB.
+
+    Tiles are removed down to 90% of the cap, so a full cache is not rescanned
+    for every page. The size found is the new running size of this process.
+    """
+    if max_bytes is None:
+        max_bytes = RENDER_CACHE_MAX_MB * 1024 * 1024
+    RENDER_CACHE_STATS["writes"] = 0
+    if not RENDER_CACHE_DIR.is_dir():
+        RENDER_CACHE_STATS["bytes"] = 0
+        return
+    tiles = []
+    for entry in os.scandir(RENDER_CACHE_DIR):
+        if entry.is_file() and entry.name.endswith(".png") and ".tmp." not in entry.name:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another worker meanwhile
+            tiles.append((stat.st_mtime, entry.path, stat.st_size))
+    total_bytes = sum(size for _, _, size in tiles)
+    target_bytes = max_bytes * 0.9 if total_bytes > max_bytes else total_bytes
+    for _, path, size in sorted(tiles):
+        if total_bytes <= target_bytes:
+            break
+        total_bytes -= size
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    RENDER_CACHE_STATS["bytes"] = total_bytes
+
+
+def find_page_image(json_path):
+    """Finds the image an OCR result was made from: the saved page image or the input image."""
+    basename = json_path.stem
+    candidates = [json_path.with_suffix(".png")]
+    candidates += [INPUT_DIR / f"{basename}{ext}" for ext in (".png", ".jpg", ".jpeg")]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def rendered_path_for(json_path):
+    return json_path.with_name(f"{json_path.stem}_rendered.png")
+
+
+def render_page(json_path, data=None):
+    """Renders the translated rec_texts of one OCR result JSON onto its page image.
+
+    `data` is the page result if it was already read (e.g. from the
+    document's compact OCR store), otherwise the JSON is parsed. Writes
+    <basename>_rendered.png next to the JSON and returns its path, or None if
+    the page was skipped. Pages without any text (blank pages, pages skipped
+    by the OCR pre-filter) are never marked as translated, they are written
+    unchanged so a rendered chapter has all its pages.
+    """
+    json_path = Path(json_path)
+    if data is None:
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    has_text = any(str(text).strip() for text in data.get("rec_texts", []))
+    if has_text and not data.get("translated"):
+        print(f"  - {json_path} is not translated yet, skipping.")
+        return None
+
+    polygons, texts = data.get("rec_polys", []), data.get("rec_texts", [])
+    if len(polygons) != len(texts):
+        print(f"  - {json_path} has {len(texts)} translated lines for {len(polygons)} boxes, rendering the first {min(len(polygons), len(texts))}.")
+        count = min(len(polygons), len(texts))
+        polygons, texts = polygons[:count], texts[:count]
+
+    image_path = find_page_image(json_path)
+    if image_path is None:
+        print(f"  - No page image found for {json_path}, skipping. Enable \"save_page_images\" for PDFs.")
+        return None
+
+    regions = region_texts(polygons, texts)
+    output_path = rendered_path_for(json_path)
+    manifest_path = page_manifest_path(json_path)
+    image_stat = image_path.stat()
+    manifest = {
+        "image": str(image_path),
+        "image_mtime_ns": image_stat.st_mtime_ns,
+        "image_size": image_stat.st_size,
+        "regions": [region_spec(polygon, text) for polygon, text in regions],
+    }
+    if RENDER_CACHE_ENABLED and output_path.exists() and load_page_manifest(manifest_path) == manifest:
+        print(f"  - {output_path} is up to date.")
+        return output_path
+
+    img = cv2.imread(str(image_path))
+    if img is None:
+        print(f"  - Error: Could not read image {image_path}")
+        return None
+
+    written_bytes = 0
+    for (polygon, text), spec in zip(regions, manifest["regions"]):
+        written_bytes += render_region_cached(img, polygon, text, spec)
+    cv2.imwrite(str(output_path), img)
+    if RENDER_CACHE_ENABLED:
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        if written_bytes:
+            track_render_cache(written_bytes)
+    print(f"  - Rendered {output_path}")
+    return output_path
+
+
+def page_manifest_path(json_path):
+    """Returns where the render cache keeps what a page's rendered image was made from."""
+    key = hashlib.blake2b(str(Path(json_path).resolve()).encode("utf-8"), digest_size=16).hexdigest()
+    return RENDER_CACHE_DIR / "pages" / f"{key}.json"
+
+
+def load_page_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def find_page_results(root):
+    """Returns the OCR result JSON files below a folder (or the file itself), in path order."""
+    root = Path(root)
+    if root.is_file():
+        return [root]
+    return sorted(path for path in root.rglob("*.json") if not path.name.endswith("_det.json"))
+
+
+def load_stored_pages(root):
+    """Returns {page JSON path: page result} from the fresh compact OCR stores below a folder.
+
+    Reading a document's store is much cheaper than parsing all its page
+    JSON files; stale or missing stores are simply not used.
+    """
+    pages = {}
+    root = Path(root)
+    if not root.is_dir():
+        return pages
+    for store_path in root.rglob(STORE_FILENAME):
+        store = load_fresh_store(store_path.parent)
+        if store is None:
+            continue
+        with store:
+            json_paths = dict(find_store_pages(store_path.parent))
+            for page_num in store.pages():
+                pages[json_paths[page_num]] = store.page(page_num)
+    return pages
+
+
+def render_page_task(task):
+    return render_page(*task)
+
+
+def render_documents(roots, workers=1):
+    """Renders every page below the given output folders, on `workers` processes."""
+    tasks = []
+    for root in roots:
+        stored = load_stored_pages(root)
+        tasks += [(path, stored.get(path)) for path in find_page_results(root)]
+    from_store = sum(data is not None for _, data in tasks)
+    print(f"Rendering {len(tasks)} pages on {workers} worker(s)" + (f", {from_store} read from OCR stores..." if from_store else "..."))
+    if workers <= 1:
+        rendered = [render_page_task(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            rendered = list(pool.imap_unordered(render_page_task, tasks))
+    print(f"Rendered {sum(path is not None for path in rendered)}/{len(tasks)} pages.")
+
+
+def load_active_translation_dir():
+    """Returns output/<active_translation_path> from config.json, the folder last OCR'd and translated."""
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        active_translation_path = json.load(f).get("active_translation_path") or ""
+    return OUTPUT_DIR / active_translation_path.strip("/")
 
 
-# Run
 if __name__ == "__main__":
-    image_path = "/home/shivi/fuckYOU/test7.png"
-    output_path = "text_wrapped_inside_polygon.jpg"
-    polygons = [
-        [[192, 9], [223, 9], [223, 120], [192, 120]],
-        [[228, 9], [258, 9], [258, 276], [228, 276]],
-        [[263, 9], [295, 9], [295, 222], [263, 222]],
-        [[497, 7], [528, 7], [528, 208], [497, 208]],
-    ]
-    sample_text = "hi"
-    inpaint_and_draw_text(image_path, polygons, output_path, sample_text)
+    parser = argparse.ArgumentParser(description="Renders translated OCR results onto their page images.")
+    parser.add_argument("paths", nargs="*", help="output folders or page JSON files (default: the active translation folder in config.json)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of render processes (default: all cores)")
+    args = parser.parse_args()
+
+    render_documents(args.paths or [load_active_translation_dir()], max(1, args.workers))
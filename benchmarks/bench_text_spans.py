@@ -0,0 +1,91 @@
+"""Compares the per-pixel shapely scan of draw_text_inside_polygon with the mask based spans.
+
+Builds a random page of text lines, merges them like the renderer does and
+checks that both methods give the same inside segments on every text row and
+the same answer for every pixel, then times them.
+
+    python benchmarks/bench_text_spans.py [--lines 120] [--seed 0]
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+from shapely.geometry import Point
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from WORKINGtest13 import FONT_SIZE, merge_vertical_japanese_lines, polygon_interior_mask, row_segments
+
+
+def random_page(line_count, rng):
+    """Returns vertical text line boxes grouped into bubbles, like a manga page's OCR result."""
+    polygons = []
+    while len(polygons) < line_count:
+        x, y = rng.randrange(0, 1400), rng.randrange(0, 2000)
+        for column in range(rng.randrange(1, 6)):
+            left = x - column * rng.randrange(30, 40)
+            bottom = y + rng.randrange(60, 300)
+            polygons.append([[left, y], [left + 30, y], [left + 30, bottom], [left, bottom]])
+    return polygons[:line_count]
+
+
+def scan_segments(polygon, y):
+    """The original scan: one polygon.contains call per pixel of the row."""
+    minx, _, maxx, _ = map(int, polygon.bounds)
+    segments, inside, seg_start = [], False, None
+    for x in range(minx, maxx + 1):
+        if polygon.contains(Point(x, y)):
+            if not inside:
+                seg_start, inside = x, True
+        elif inside:
+            segments.append((seg_start, x))
+            inside = False
+    if inside:
+        segments.append((seg_start, maxx + 1))
+    return segments
+
+
+def text_rows(polygon):
+    _, miny, _, maxy = map(int, polygon.bounds)
+    line_height = FONT_SIZE + 4
+    return range(miny + FONT_SIZE // 2, maxy - line_height + FONT_SIZE // 2 + 1, line_height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    merged = merge_vertical_japanese_lines(random_page(args.lines, random.Random(args.seed)))
+    rows = sum(len(text_rows(polygon)) for polygon in merged)
+    print(f"{len(merged)} merged regions, {rows} text rows")
+
+    start = time.perf_counter()
+    scanned = [[scan_segments(polygon, y) for y in text_rows(polygon)] for polygon in merged]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    masked = []
+    for polygon in merged:
+        mask, minx, miny = polygon_interior_mask(polygon)
+        masked.append([row_segments(mask, minx, miny, y) for y in text_rows(polygon)])
+    mask_time = time.perf_counter() - start
+
+    if scanned != masked:
+        sys.exit("Segments differ between the shapely scan and the mask")
+
+    # Every pixel, not just the text rows, must agree with polygon.contains
+    for polygon in merged[:10]:
+        mask, minx, miny = polygon_interior_mask(polygon)
+        for (y, x), value in zip(((y, x) for y in range(mask.shape[0]) for x in range(mask.shape[1])), mask.flat):
+            if value != polygon.contains(Point(x + minx, y + miny)):
+                sys.exit(f"Mask differs from polygon.contains at ({x + minx}, {y + miny})")
+
+    print(f"shapely scan: {scan_time * 1000:.1f} ms")
+    print(f"mask + spans: {mask_time * 1000:.1f} ms ({scan_time / mask_time:.0f}x faster), identical segments")
+
+
+if __name__ == "__main__":
+    main()
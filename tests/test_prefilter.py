@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "OCR"))
+
+pytest.importorskip("paddleocr")
+pytest.importorskip("pdf2image")
+pytest.importorskip("docx2pdf")
+import coordinate_extractor  # noqa: E402
+
+
+def bubble_page(words, size=(3000, 2000)):
+    """A mostly white page with panel borders and one short word per speech bubble."""
+    height, width = size
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.rectangle(page, (60, 60), (width - 60, height // 2 - 30), (0, 0, 0), 6)
+    cv2.rectangle(page, (60, height // 2 + 30), (width - 60, height - 60), (0, 0, 0), 6)
+    for i, word in enumerate(words):
+        center = (width // 2, height // 4 * (1 + 2 * i))
+        cv2.ellipse(page, center, (380, 200), 0, 0, 360, (0, 0, 0), 5)
+        (text_width, text_height), _ = cv2.getTextSize(word, cv2.FONT_HERSHEY_SIMPLEX, 2.2, 6)
+        origin = (center[0] - text_width // 2, center[1] + text_height // 2)
+        cv2.putText(page, word, origin, cv2.FONT_HERSHEY_SIMPLEX, 2.2, (0, 0, 0), 6)
+    return page
+
+
+def test_sparse_bubble_page_is_not_skipped():
+    has_text, reason = coordinate_extractor.page_has_plausible_text(bubble_page(["HELLO", "WORLD"]))
+    assert has_text, reason
+
+
+def test_blank_page_is_skipped():
+    has_text, _ = coordinate_extractor.page_has_plausible_text(np.full((3000, 2000, 3), 255, dtype=np.uint8))
+    assert not has_text
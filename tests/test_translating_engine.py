@@ -0,0 +1,67 @@
+import sys
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Translate" / "firefox_scripts"))
+
+pytest.importorskip("selenium")
+import translating_engine  # noqa: E402
+
+
+class FakeTranslator:
+    """Stands in for DeepLTranslator, "translates" by upper-casing every line."""
+
+    from_lan = "auto"
+    to_lan = "en-us"
+
+    def __init__(self):
+        self.requests = []
+
+    def deepl(self, content):
+        self.requests.append(content)
+        separator = translating_engine.SEPARATOR
+        return separator.join(line.upper() for line in content.split(separator))
+
+    def clear_text_areas(self):
+        pass
+
+
+def test_reused_page_is_translated_with_its_source(tmp_path, monkeypatch):
+    translator = FakeTranslator()
+    logger = logging.getLogger(__name__)
+
+    class FakeSession:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def translate(self, request):
+            return translating_engine.translate_request(request, translator, logger)[1]
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(translating_engine, "TranslationSession", FakeSession)
+
+    chapter_1 = tmp_path / "chapter_1" / "page_1_results"
+    chapter_2 = tmp_path / "chapter_2" / "page_1_results"
+    chapter_1.mkdir(parents=True)
+    chapter_2.mkdir(parents=True)
+    source = chapter_1 / "page_1.json"
+    copy = chapter_2 / "page_1.json"
+    source.write_text(json.dumps({"rec_texts": ["credits", "thanks for reading"]}), encoding="utf-8")
+    copy.write_text(json.dumps({"rec_texts": ["credits", "thanks for reading"],
+                                "reused_from": "chapter_1/page_1_results/page_1.json"}), encoding="utf-8")
+
+    # Room for the lines of one page per request, so a copy that is sent gets its own request
+    config = {"translation_char_budget": 40}
+    translated = translating_engine.translate_files([str(source), str(copy)], config, str(tmp_path), logger)
+
+    assert translated == 2
+    assert len(translator.requests) == 1
+    for path in (source, copy):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        assert data["translated"]
+        assert data["rec_texts"] == ["CREDITS", "THANKS FOR READING"]